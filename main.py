@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from tabs.tabs import (ImageResizerTab, PdfToImageTab)
 from tabs.img_to_pdf import ImageToPdfTab
 from tabs.combine_pdf_tab import CombinePdfTab
@@ -37,13 +38,15 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == "__main__":
+    # Pool processes are spawned; frozen builds must not rerun the app in them
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     
     try:
         from pdf2image import convert_from_path
         from PIL import Image
         from fpdf import FPDF
-        from PyPDF2 import PdfMerger
+        from PyPDF2 import PdfWriter
     except ImportError as e:
         QMessageBox.critical(None, "Error", 
                            f"Required packages not found. Please install:\n\n"
@@ -1,16 +1,23 @@
 import os
-from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QLabel, QFileDialog, QMessageBox, QListWidget, 
-                             QListWidgetItem, QAbstractItemView)
-from PyQt5.QtCore import Qt, QSize, QMimeData
-from PyQt5.QtGui import QIcon, QColor, QDragEnterEvent, QDropEvent
-from PyPDF2 import PdfMerger
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
+                             QLabel, QFileDialog, QMessageBox, QProgressBar, QCheckBox)
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QIcon, QDragEnterEvent, QDropEvent
+from tabs.file_list import FileListModel, FileListView, FileListDelegate
+from workers.workers import PdfMergeWorker, PdfIndexWorker, page_selection_runs
 
 
 class CombinePdfTab(QWidget):
     def __init__(self):
         super().__init__()
-        self.pdf_files = []
+        # Files in merge order; each row's text is its page selection, e.g.
+        # "1-3,last", and empty means all pages
+        self.file_model = FileListModel(self)
+        self.worker = None
+        # Background index of added files keyed by path; entries are only
+        # trusted while the file's mtime is unchanged
+        self.pdf_index = {}
+        self.indexers = []
         self.init_ui()
         self.setAcceptDrops(True)
 
@@ -24,44 +31,71 @@ class CombinePdfTab(QWidget):
         add_btn.clicked.connect(self.add_pdfs)
         layout.addWidget(add_btn)
 
-        # PDF list with scrollable area
-        self.list_widget = QListWidget()
-        self.list_widget.setSelectionMode(QAbstractItemView.SingleSelection)
-        self.list_widget.setDragDropMode(QAbstractItemView.InternalMove)
-        self.list_widget.setDefaultDropAction(Qt.MoveAction)
-        self.list_widget.setAcceptDrops(True)
-        self.list_widget.setDragEnabled(True)
-        layout.addWidget(self.list_widget)
+        # PDF list; rows are painted by the delegate, not built from widgets
+        self.list_view = FileListView()
+        self.list_view.setModel(self.file_model)
+        delegate = FileListDelegate(self.list_view, editable=True, edit_button=True,
+                                    placeholder="All pages (e.g. 1-3,5,last)")
+        delegate.edit_requested.connect(self.edit_item)
+        delegate.remove_requested.connect(self.remove_item)
+        # Queued so a warning about the text is shown after the editor closes
+        delegate.text_edited.connect(self.set_page_selection, Qt.QueuedConnection)
+        self.list_view.setItemDelegate(delegate)
+        layout.addWidget(self.list_view)
 
-        # Convert button
+        # Streaming merge keeps memory bounded for very large inputs
+        self.streaming_check = QCheckBox("Low-memory streaming merge (bookmarks are not kept)")
+        layout.addWidget(self.streaming_check)
+
+        # Deduplication is done by the streaming writer, so it implies streaming
+        self.dedupe_check = QCheckBox("Share identical fonts, images and ICC profiles across files "
+                                      "(streaming merge, bookmarks are not kept)")
+        self.dedupe_check.toggled.connect(self.toggle_dedupe)
+        layout.addWidget(self.dedupe_check)
+
+        self.linearize_check = QCheckBox("Linearize output (fast web view)")
+        layout.addWidget(self.linearize_check)
+
+        # Progress Bar
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+
+        # Status Label
+        self.status_label = QLabel("Ready")
+        layout.addWidget(self.status_label)
+
+        # Convert and cancel buttons
+        button_layout = QHBoxLayout()
         self.convert_btn = QPushButton("Combine PDFs")
         self.convert_btn.clicked.connect(self.combine_pdfs)
         self.convert_btn.setEnabled(False)
-        layout.addWidget(self.convert_btn)
+        button_layout.addWidget(self.convert_btn)
+
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setIcon(QIcon.fromTheme("process-stop"))
+        self.cancel_btn.clicked.connect(self.cancel_combine)
+        self.cancel_btn.setEnabled(False)
+        button_layout.addWidget(self.cancel_btn)
+        layout.addLayout(button_layout)
 
         layout.addStretch()
 
+    def toggle_dedupe(self, checked):
+        if checked:
+            self.streaming_check.setChecked(True)
+        self.streaming_check.setEnabled(not checked)
+
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
 
     def dropEvent(self, event: QDropEvent):
         urls = event.mimeData().urls()
-        new_files = []
-        
-        for url in urls:
-            if url.isLocalFile():
-                file_path = url.toLocalFile()
-                if file_path.lower().endswith('.pdf'):
-                    if file_path not in self.pdf_files:
-                        new_files.append(file_path)
-        
-        if new_files:
-            self.pdf_files.extend(new_files)
-            for file in new_files:
-                self.add_list_item(file)
-            
-            self.convert_btn.setEnabled(len(self.pdf_files) > 0)
+        files = [url.toLocalFile() for url in urls
+                 if url.isLocalFile() and url.toLocalFile().lower().endswith('.pdf')]
+        self.add_files(files)
 
     def add_pdfs(self):
         files, _ = QFileDialog.getOpenFileNames(
@@ -69,111 +103,189 @@ class CombinePdfTab(QWidget):
         )
         
         if files:
-            for file in files:
-                if file not in self.pdf_files:
-                    self.pdf_files.append(file)
-                    self.add_list_item(file)
-            
-            self.convert_btn.setEnabled(len(self.pdf_files) > 0)
-
-    def add_list_item(self, file_path):
-        item = QListWidgetItem()
-        item.setData(Qt.UserRole, file_path)
-        
-        widget = QWidget()
-        layout = QHBoxLayout(widget)
-        layout.setContentsMargins(5, 2, 5, 2)
-        
-        # File name label
-        label = QLabel(os.path.basename(file_path))
-        label.setStyleSheet("QLabel { margin-right: 10px; }")
-        layout.addWidget(label)
-        
-        # Edit button
-        edit_btn = QPushButton()
-        edit_btn.setIcon(QIcon.fromTheme("document-edit"))
-        edit_btn.setFixedSize(24, 24)
-        edit_btn.clicked.connect(lambda: self.edit_item(item))
-        layout.addWidget(edit_btn)
-        
-        # Delete button
-        delete_btn = QPushButton()
-        delete_btn.setIcon(QIcon.fromTheme("list-remove"))
-        delete_btn.setFixedSize(24, 24)
-        delete_btn.clicked.connect(lambda: self.remove_item(item))
-        layout.addWidget(delete_btn)
-        
-        layout.addStretch()
-        item.setSizeHint(widget.sizeHint())
-        self.list_widget.addItem(item)
-        self.list_widget.setItemWidget(item, widget)
+            self.add_files(files)
+
+    def add_files(self, files):
+        new_files = self.file_model.add_files(files, detail="Indexing...")
+        for file in new_files:
+            self.show_index_info(file)
+        self.index_pdfs(new_files)
+        self.convert_btn.setEnabled(self.file_model.rowCount() > 0 and self.worker is None)
+
+    def index_entry(self, file_path):
+        """Cached index entry for file_path, or None if missing or stale"""
+        entry = self.pdf_index.get(file_path)
+        try:
+            if entry and entry["mtime"] == os.stat(file_path).st_mtime:
+                return entry
+        except OSError:
+            pass
+        return None
 
-    def edit_item(self, item):
-        old_path = item.data(Qt.UserRole)
+    def index_pdfs(self, files):
+        files = [file for file in files if self.index_entry(file) is None]
+        if not files:
+            return
+        indexer = PdfIndexWorker(files)
+        indexer.file_indexed.connect(self.file_indexed)
+        indexer.finished.connect(lambda: self.indexer_done(indexer))
+        self.indexers.append(indexer)
+        indexer.start()
+
+    def indexer_done(self, indexer):
+        self.indexers.remove(indexer)
+        # The custom finished signal is emitted from inside run(); let the
+        # thread return before it is deleted
+        indexer.wait()
+        indexer.deleteLater()
+
+    def file_indexed(self, info):
+        self.pdf_index[info["path"]] = info
+        self.show_index_info(info["path"])
+
+    def show_index_info(self, file_path):
+        info = self.pdf_index.get(file_path)
+        if info is None:
+            return
+        if info["error"]:
+            self.file_model.set_detail(file_path, f"⚠ {info['error']}", warning=True)
+            return
+
+        sizes = set(info["page_sizes"])
+        size_text = "%d×%d pt" % next(iter(sizes)) if len(sizes) == 1 else "mixed sizes"
+        text = f"{info['pages']} pages, {size_text}"
+        if info["encrypted"]:
+            text += ", encrypted"
+        self.file_model.set_detail(file_path, text)
+
+    def set_page_selection(self, row, text):
+        file_path = self.file_model.paths()[row]
+        entry = self.index_entry(file_path)
+        try:
+            # Without an index entry only the syntax can be checked
+            page_selection_runs(text, entry["pages"] if entry and not entry["error"] else 10 ** 9)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", f"Invalid page selection: {str(e)}")
+            return
+        self.file_model.setData(self.file_model.index(row), text)
+
+    def edit_item(self, row):
+        old_path = self.file_model.paths()[row]
         new_path, _ = QFileDialog.getOpenFileName(
             self, "Select PDF file", os.path.dirname(old_path), "PDF Files (*.pdf)"
         )
         
-        if new_path and new_path != old_path:
-            index = self.pdf_files.index(old_path)
-            self.pdf_files[index] = new_path
-            self.add_list_item(new_path)
-            self.list_widget.takeItem(self.list_widget.row(item))
-
-    def remove_item(self, item):
-        file_path = item.data(Qt.UserRole)
-        self.pdf_files.remove(file_path)
-        self.list_widget.takeItem(self.list_widget.row(item))
-        self.convert_btn.setEnabled(len(self.pdf_files) > 0)
+        if new_path and new_path != old_path and new_path not in self.file_model.row_numbers:
+            self.file_model.replace_path(row, new_path)
+            self.file_model.set_detail(new_path, "Indexing...")
+            self.show_index_info(new_path)
+            self.index_pdfs([new_path])
+
+    def remove_item(self, row):
+        self.file_model.remove_row(row)
+        self.convert_btn.setEnabled(self.file_model.rowCount() > 0 and self.worker is None)
 
     def combine_pdfs(self):
-        if not self.pdf_files:
+        # Use the order from the list
+        pdf_files = self.file_model.paths()
+        page_selections = self.file_model.texts()
+        if not pdf_files:
             return
-            
-        try:
-            # Get output directory from first file
-            output_dir = os.path.dirname(self.pdf_files[0])
-            output_path = os.path.join(output_dir, "combined.pdf")
-            
-            # Check if file exists
-            if os.path.exists(output_path):
-                reply = QMessageBox.question(
-                    self, "File Exists", 
-                    "combined.pdf already exists. Overwrite?",
-                    QMessageBox.Yes | QMessageBox.No
-                )
-                if reply == QMessageBox.No:
-                    return
-            
-            # Update UI
-            self.convert_btn.setEnabled(False)
-            self.convert_btn.setText("Processing...")
-            QApplication.processEvents()
-            
-            # Combine PDFs
-            merger = PdfMerger()
-            
-            # Use the order from the list widget
-            for i in range(self.list_widget.count()):
-                item = self.list_widget.item(i)
-                file_path = item.data(Qt.UserRole)
-                merger.append(file_path)
-            
-            merger.write(output_path)
-            merger.close()
-            
-            # Update UI
-            self.convert_btn.setText("Combination Complete!")
-            self.convert_btn.setStyleSheet("background-color: green; color: white;")
-            QMessageBox.information(self, "Success", 
-                                  f"PDFs combined successfully at:\n{output_path}")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An error occurred:\n{str(e)}")
-        finally:
-            self.reset_button_style()
+
+        # Get output directory from first file
+        output_dir = os.path.dirname(pdf_files[0])
+        output_path = os.path.join(output_dir, "combined.pdf")
+        
+        # Check if file exists
+        if os.path.exists(output_path):
+            reply = QMessageBox.question(
+                self, "File Exists", 
+                "combined.pdf already exists. Overwrite?",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reply == QMessageBox.No:
+                return
+
+
+        # Refuse up front instead of failing halfway through the merge
+        page_counts = {}
+        problems = []
+        for file_path in pdf_files:
+            entry = self.index_entry(file_path)
+            if entry is None:
+                continue
+            if entry["error"]:
+                problems.append(f"{os.path.basename(file_path)}: {entry['error']}")
+                continue
+            page_counts[file_path] = entry["pages"]
+            try:
+                page_selection_runs(page_selections.get(file_path, ""), entry["pages"])
+            except ValueError as e:
+                problems.append(f"{os.path.basename(file_path)}: {str(e)}")
+        if problems:
+            QMessageBox.warning(self, "Error", "These files cannot be combined:\n\n"
+                                + "\n".join(problems))
+            return
+
+        # Update UI
+        self.convert_btn.setEnabled(False)
+        self.convert_btn.setText("Processing...")
+        self.cancel_btn.setEnabled(True)
+        self.progress_bar.setValue(0)
+
+        self.worker = PdfMergeWorker(pdf_files, output_path,
+                                     streaming=self.streaming_check.isChecked(),
+                                     dedupe=self.dedupe_check.isChecked(),
+                                     linearize=self.linearize_check.isChecked(),
+                                     page_selections=page_selections,
+                                     page_counts=page_counts)
+        self.worker.progress_updated.connect(self.update_progress)
+        self.worker.finished.connect(self.combine_complete)
+        self.worker.error_occurred.connect(self.show_error)
+        self.worker.cancelled.connect(self.combine_cancelled)
+        self.worker.start()
+
+    def cancel_combine(self):
+        if self.worker:
+            self.worker.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.status_label.setText("Cancelling...")
+
+    def update_progress(self, value, status):
+        self.progress_bar.setValue(value)
+        self.status_label.setText(status)
+
+    def combine_complete(self, output_path):
+        self.convert_btn.setText("Combination Complete!")
+        self.convert_btn.setStyleSheet("background-color: green; color: white;")
+        message = f"PDFs combined successfully at:\n{output_path}"
+        if self.worker.dedupe:
+            message += (f"\n\nShared {self.worker.duplicates} duplicate streams, "
+                        f"saved {self.worker.bytes_saved / 1024:.0f} KB")
+        QMessageBox.information(self, "Success", message)
+        self.worker_done()
+
+    def combine_cancelled(self):
+        self.status_label.setText("Cancelled")
+        self.progress_bar.setValue(0)
+        self.worker_done()
+
+    def show_error(self, error_msg):
+        QMessageBox.critical(self, "Error", f"An error occurred:\n{error_msg}")
+        self.status_label.setText("Failed")
+        self.progress_bar.setValue(0)
+        self.worker_done()
+
+    def worker_done(self):
+        # Signals are emitted from inside run(); let the thread return
+        # before it is deleted
+        self.worker.wait()
+        self.worker.deleteLater()
+        self.worker = None
+        self.cancel_btn.setEnabled(False)
+        self.reset_button_style()
 
     def reset_button_style(self):
         self.convert_btn.setStyleSheet("")
         self.convert_btn.setText("Combine PDFs")
-        self.convert_btn.setEnabled(len(self.pdf_files) > 0)
\ No newline at end of file
+        self.convert_btn.setEnabled(self.file_model.rowCount() > 0)
@@ -0,0 +1,315 @@
+import os
+from PyQt5.QtWidgets import (QListView, QStyledItemDelegate, QStyle, QStyleOptionButton,
+                             QStyleOptionFrame, QStyleOptionViewItem, QApplication,
+                             QLineEdit, QAbstractItemView)
+from PyQt5.QtCore import (Qt, QAbstractListModel, QModelIndex, QRect, QSize, QEvent,
+                          pyqtSignal)
+from PyQt5.QtGui import QIcon, QColor
+
+# Extra item data roles; Qt.UserRole holds the file path
+DETAIL_ROLE = Qt.UserRole + 1
+WARNING_ROLE = Qt.UserRole + 2
+REMOVABLE_ROLE = Qt.UserRole + 3
+
+
+class FileListModel(QAbstractListModel):
+    """Ordered list of files with a detail text and an editable text per row"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        # Row number by path, rebuilt after rows are moved or removed
+        self.row_numbers = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(row["path"])
+        if role == Qt.ToolTipRole:
+            return row["path"]
+        if role == Qt.UserRole:
+            return row["path"]
+        if role == Qt.EditRole:
+            return row["text"]
+        if role == Qt.FontRole and row["bold"]:
+            font = QApplication.font()
+            font.setBold(True)
+            return font
+        if role == DETAIL_ROLE:
+            return row["detail"]
+        if role == WARNING_ROLE:
+            return row["warning"]
+        if role == REMOVABLE_ROLE:
+            return row["removable"]
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        self.rows[index.row()]["text"] = value
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            # Dropping between rows
+            return Qt.ItemIsDropEnabled
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled | Qt.ItemIsEditable
+
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    def moveRows(self, source_parent, source_row, count, destination_parent, destination_row):
+        if destination_row in range(source_row, source_row + count + 1):
+            return False
+        if not self.beginMoveRows(source_parent, source_row, source_row + count - 1,
+                                  destination_parent, destination_row):
+            return False
+        moved = self.rows[source_row:source_row + count]
+        del self.rows[source_row:source_row + count]
+        if destination_row > source_row:
+            destination_row -= count
+        self.rows[destination_row:destination_row] = moved
+        self.update_row_numbers()
+        self.endMoveRows()
+        return True
+
+    def update_row_numbers(self):
+        self.row_numbers = {row["path"]: number for number, row in enumerate(self.rows)}
+
+    def new_row(self, path, detail="", warning=False, bold=False, removable=True):
+        return {"path": path, "text": "", "detail": detail, "warning": warning,
+                "bold": bold, "removable": removable}
+
+    def add_files(self, paths, **fields):
+        """Append paths not in the list yet, returns the ones added"""
+        paths = [path for path in dict.fromkeys(paths) if path not in self.row_numbers]
+        if paths:
+            # One insert for the whole batch instead of one per file
+            first = len(self.rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(paths) - 1)
+            for path in paths:
+                self.row_numbers[path] = len(self.rows)
+                self.rows.append(self.new_row(path, **fields))
+            self.endInsertRows()
+        return paths
+
+    def set_files(self, rows):
+        """Replace the whole list with rows of (path, fields) pairs"""
+        self.beginResetModel()
+        self.rows = [self.new_row(path, **fields) for path, fields in rows]
+        self.update_row_numbers()
+        self.endResetModel()
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.update_row_numbers()
+        self.endRemoveRows()
+
+    def replace_path(self, row, path):
+        self.rows[row] = self.new_row(path)
+        self.update_row_numbers()
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def set_detail(self, path, detail, warning=False):
+        row = self.row_numbers.get(path)
+        if row is None:
+            return
+        self.rows[row]["detail"] = detail
+        self.rows[row]["warning"] = warning
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [DETAIL_ROLE, WARNING_ROLE])
+
+    def paths(self):
+        return [row["path"] for row in self.rows]
+
+    def texts(self):
+        """Editable text by path, for rows where it is set"""
+        return {row["path"]: row["text"] for row in self.rows if row["text"]}
+
+
+class FileListView(QListView):
+    """List view that reorders rows by drag and drop"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setDragDropMode(QAbstractItemView.InternalMove)
+        self.setDefaultDropAction(Qt.MoveAction)
+        self.setDropIndicatorShown(True)
+        # Every row has the same height, so layout does not query each row
+        self.setUniformItemSizes(True)
+
+    def dropEvent(self, event):
+        if event.source() is not self:
+            event.ignore()
+            return
+
+        source = self.currentIndex()
+        target = self.indexAt(event.pos())
+        if not target.isValid():
+            destination = self.model().rowCount()
+        elif event.pos().y() > self.visualRect(target).center().y():
+            destination = target.row() + 1
+        else:
+            destination = target.row()
+        if source.isValid():
+            self.model().moveRow(QModelIndex(), source.row(), QModelIndex(), destination)
+
+        # The row was moved here; a move action would make the view remove
+        # the source row afterwards
+        event.setDropAction(Qt.CopyAction)
+        event.accept()
+
+
+class FileListDelegate(QStyledItemDelegate):
+    """Paints a row as name, detail text, an optional text field and
+    edit/remove buttons without creating widgets per row"""
+
+    edit_requested = pyqtSignal(int)
+    remove_requested = pyqtSignal(int)
+    text_edited = pyqtSignal(int, str)
+
+    BUTTON_SIZE = 24
+    FIELD_WIDTH = 160
+    MARGIN = 5
+
+    def __init__(self, view, editable=False, placeholder="", edit_button=False):
+        super().__init__(view)
+        self.view = view
+        self.editable = editable
+        self.placeholder = placeholder
+        self.edit_button = edit_button
+        self.edit_icon = QIcon.fromTheme("document-edit")
+        self.remove_icon = QIcon.fromTheme("list-remove")
+
+    def layout(self, rect):
+        """Rects for the buttons and text field of a row, from the right"""
+        parts = [("remove", self.BUTTON_SIZE)]
+        if self.edit_button:
+            parts.append(("edit", self.BUTTON_SIZE))
+        if self.editable:
+            parts.append(("field", self.FIELD_WIDTH))
+
+        right = rect.right() - self.MARGIN
+        top = rect.top() + (rect.height() - self.BUTTON_SIZE) // 2
+        rects = {}
+        for name, width in parts:
+            rects[name] = QRect(right - width + 1, top, width, self.BUTTON_SIZE)
+            right -= width + self.MARGIN
+        rects["text"] = QRect(rect.left() + self.MARGIN, rect.top(),
+                              right - rect.left() - self.MARGIN, rect.height())
+        return rects
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(),
+                     max(self.BUTTON_SIZE + 4, option.fontMetrics.height() + 10))
+
+    def paint(self, painter, option, index):
+        option = QStyleOptionViewItem(option)
+        self.initStyleOption(option, index)
+        widget = option.widget
+        style = widget.style() if widget else QApplication.style()
+
+        # Background and selection only; the text is laid out below
+        name = option.text
+        option.text = ""
+        style.drawControl(QStyle.CE_ItemViewItem, option, painter, widget)
+
+        rects = self.layout(option.rect)
+        selected = option.state & QStyle.State_Selected
+        text_color = option.palette.highlightedText() if selected else option.palette.text()
+        painter.save()
+
+        # File name, then the detail text in the space left over
+        text_rect = rects["text"]
+        painter.setFont(option.font)
+        painter.setPen(text_color.color())
+        metrics = painter.fontMetrics()
+        name = metrics.elidedText(name, Qt.ElideMiddle, text_rect.width())
+        painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignLeft, name)
+
+        detail = index.data(DETAIL_ROLE)
+        detail_left = metrics.horizontalAdvance(name) + 10
+        if detail and detail_left < text_rect.width():
+            painter.setFont(widget.font() if widget else QApplication.font())
+            if index.data(WARNING_ROLE):
+                painter.setPen(QColor("red"))
+            elif not selected:
+                painter.setPen(QColor("gray"))
+            detail_rect = text_rect.adjusted(detail_left, 0, 0, 0)
+            detail = painter.fontMetrics().elidedText(detail, Qt.ElideRight, detail_rect.width())
+            painter.drawText(detail_rect, Qt.AlignVCenter | Qt.AlignLeft, detail)
+
+        if "field" in rects:
+            field = QStyleOptionFrame()
+            field.rect = rects["field"]
+            field.state = QStyle.State_Enabled | QStyle.State_Sunken
+            field.lineWidth = 1
+            field.palette = option.palette
+            style.drawPrimitive(QStyle.PE_PanelLineEdit, field, painter, widget)
+
+            text = index.data(Qt.EditRole)
+            painter.setFont(widget.font() if widget else QApplication.font())
+            painter.setPen(option.palette.text().color() if text else QColor("gray"))
+            text_rect = rects["field"].adjusted(4, 0, -4, 0)
+            painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignLeft,
+                             painter.fontMetrics().elidedText(text or self.placeholder,
+                                                              Qt.ElideRight, text_rect.width()))
+        painter.restore()
+
+        for name, icon in (("edit", self.edit_icon), ("remove", self.remove_icon)):
+            if name not in rects or name == "remove" and not index.data(REMOVABLE_ROLE):
+                continue
+            button = QStyleOptionButton()
+            button.rect = rects[name]
+            button.icon = icon
+            button.iconSize = QSize(16, 16)
+            button.state = QStyle.State_Enabled | QStyle.State_Raised
+            button.palette = option.palette
+            style.drawControl(QStyle.CE_PushButton, button, painter, widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease):
+            return False
+
+        rects = self.layout(option.rect)
+        for name in ("edit", "remove", "field"):
+            if name not in rects or not rects[name].contains(event.pos()):
+                continue
+            if name == "remove" and not index.data(REMOVABLE_ROLE):
+                return False
+            # Presses on a button must not start a drag or change the selection
+            if event.type() == QEvent.MouseButtonRelease:
+                if name == "edit":
+                    self.edit_requested.emit(index.row())
+                elif name == "remove":
+                    self.remove_requested.emit(index.row())
+                else:
+                    self.view.edit(index)
+            return True
+        return False
+
+    def createEditor(self, parent, option, index):
+        if not self.editable:
+            return None
+        editor = QLineEdit(parent)
+        editor.setPlaceholderText(self.placeholder)
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setText(index.data(Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        # The owner validates the text before storing it in the model
+        self.text_edited.emit(index.row(), editor.text().strip())
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(self.layout(option.rect)["field"])
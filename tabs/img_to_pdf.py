@@ -1,11 +1,11 @@
 import os
-from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QLabel, QFileDialog, QMessageBox, QListWidget, 
-                             QListWidgetItem, QAbstractItemView)
-from PyQt5.QtCore import Qt, QSize
-from PyQt5.QtGui import QIcon, QColor
-from fpdf import FPDF
-from PIL import Image
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
+                             QLabel, QFileDialog, QMessageBox, QCheckBox, QProgressBar, QSpinBox)
+from PyQt5.QtGui import QIcon
+from tabs.file_list import FileListModel, FileListView, FileListDelegate
+from workers.workers import ImageToPdfWorker
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
 
 
 class ImageToPdfTab(QWidget):
@@ -13,8 +13,11 @@ class ImageToPdfTab(QWidget):
         super().__init__()
         self.selected_folder = ""
         self.additional_images = []
+        # Images in conversion order
+        self.file_model = FileListModel(self)
         self.MIN_WIDTH = 300  # 300pt = ~106mm
         self.MAX_WIDTH = 584   # 584pt = ~206mm
+        self.worker = None
         self.init_ui()
 
     def init_ui(self):
@@ -40,18 +43,72 @@ class ImageToPdfTab(QWidget):
         add_images_btn.clicked.connect(self.add_images)
         layout.addWidget(add_images_btn)
 
-        # Image list with scrollable area
-        self.list_widget = QListWidget()
-        self.list_widget.setSelectionMode(QAbstractItemView.SingleSelection)
-        self.list_widget.setDragDropMode(QAbstractItemView.InternalMove)
-        self.list_widget.setDefaultDropAction(Qt.MoveAction)
-        layout.addWidget(self.list_widget)
+        # Image list; rows are painted by the delegate, not built from widgets
+        self.list_view = FileListView()
+        self.list_view.setModel(self.file_model)
+        delegate = FileListDelegate(self.list_view)
+        delegate.remove_requested.connect(self.remove_item)
+        self.list_view.setItemDelegate(delegate)
+        layout.addWidget(self.list_view)
+
+        # Preprocessing downsamples and recompresses images in parallel
+        preprocess_layout = QHBoxLayout()
+        self.preprocess_check = QCheckBox("Downsample images")
+        self.target_dpi_input = QSpinBox()
+        self.target_dpi_input.setRange(72, 1200)
+        self.target_dpi_input.setValue(150)
+        self.target_dpi_input.setSuffix(" DPI")
+        self.target_dpi_input.setEnabled(False)
+        self.jpeg_quality_input = QSpinBox()
+        self.jpeg_quality_input.setRange(1, 95)
+        self.jpeg_quality_input.setValue(85)
+        self.jpeg_quality_input.setEnabled(False)
+        self.processes_input = QSpinBox()
+        self.processes_input.setRange(1, 256)
+        self.processes_input.setValue(os.cpu_count() or 1)
+        self.processes_input.setEnabled(False)
+        self.preprocess_check.toggled.connect(self.target_dpi_input.setEnabled)
+        self.preprocess_check.toggled.connect(self.jpeg_quality_input.setEnabled)
+        self.preprocess_check.toggled.connect(self.processes_input.setEnabled)
+        preprocess_layout.addWidget(self.preprocess_check)
+        preprocess_layout.addWidget(QLabel("Target:"))
+        preprocess_layout.addWidget(self.target_dpi_input)
+        preprocess_layout.addWidget(QLabel("JPEG quality:"))
+        preprocess_layout.addWidget(self.jpeg_quality_input)
+        preprocess_layout.addWidget(QLabel("Processes:"))
+        preprocess_layout.addWidget(self.processes_input)
+        preprocess_layout.addStretch()
+        layout.addLayout(preprocess_layout)
+
+        self.streaming_check = QCheckBox("Streaming mode (low memory)")
+        layout.addWidget(self.streaming_check)
+
+        self.linearize_check = QCheckBox("Linearize output (fast web view)")
+        layout.addWidget(self.linearize_check)
 
-        # Convert button
+        # Progress Bar
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+
+        # Status Label
+        self.status_label = QLabel("Ready")
+        layout.addWidget(self.status_label)
+
+        # Convert and cancel buttons
+        button_layout = QHBoxLayout()
         self.convert_btn = QPushButton("Convert to PDF")
         self.convert_btn.clicked.connect(self.convert_images_to_pdf)
         self.convert_btn.setEnabled(False)
-        layout.addWidget(self.convert_btn)
+        button_layout.addWidget(self.convert_btn)
+
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setIcon(QIcon.fromTheme("process-stop"))
+        self.cancel_btn.clicked.connect(self.cancel_conversion)
+        self.cancel_btn.setEnabled(False)
+        button_layout.addWidget(self.cancel_btn)
+        layout.addLayout(button_layout)
 
         layout.addStretch()
 
@@ -75,157 +132,130 @@ class ImageToPdfTab(QWidget):
             self.check_convert_button()
 
     def update_image_list(self):
-        self.list_widget.clear()
         valid_extensions = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
+        rows = []
 
         # Add folder images first (sorted by name)
         if self.selected_folder:
-            folder_images = []
             for file in sorted(os.listdir(self.selected_folder)):
                 if file.lower().endswith(valid_extensions):
                     full_path = os.path.join(self.selected_folder, file)
-                    folder_images.append(full_path)
-            
-            for img_path in folder_images:
-                self.add_list_item(img_path, is_folder_image=True)
+                    rows.append((full_path, self.row_fields(full_path, is_folder_image=True)))
 
         # Add additional images
         for img_path in self.additional_images:
-            self.add_list_item(img_path, is_folder_image=False)
+            rows.append((img_path, self.row_fields(img_path, is_folder_image=False)))
 
-    def add_list_item(self, img_path, is_folder_image):
-        item = QListWidgetItem()
-        item.setData(Qt.UserRole, (img_path, is_folder_image))
-        
-        widget = QWidget()
-        layout = QHBoxLayout(widget)
-        layout.setContentsMargins(5, 2, 5, 2)
-        
-        # File name label
-        label = QLabel(os.path.basename(img_path))
-        label.setStyleSheet("QLabel { margin-right: 10px; }")
-        if is_folder_image:
-            label.setStyleSheet("QLabel { margin-right: 10px; font-weight: bold; }")
-        layout.addWidget(label)
-        
-        # Only show delete button for additional images
-        if not is_folder_image:
-            # Delete button
-            delete_btn = QPushButton()
-            delete_btn.setIcon(QIcon.fromTheme("list-remove"))
-            delete_btn.setFixedSize(24, 24)
-            delete_btn.clicked.connect(lambda: self.remove_item(item))
-            layout.addWidget(delete_btn)
-        
-        layout.addStretch()
-        item.setSizeHint(widget.sizeHint())
-        self.list_widget.addItem(item)
-        self.list_widget.setItemWidget(item, widget)
+        self.file_model.set_files(rows)
 
-    def remove_item(self, item):
-        img_path, is_folder_image = item.data(Qt.UserRole)
-        if not is_folder_image and img_path in self.additional_images:
+    def row_fields(self, img_path, is_folder_image):
+        # JPEGs are embedded as-is; anything else is decoded and re-encoded.
+        # Only additional images can be removed from the list
+        converted = not img_path.lower().endswith(JPEG_EXTENSIONS)
+        return {"detail": "converted" if converted else "",
+                "bold": is_folder_image, "removable": not is_folder_image}
+
+    def remove_item(self, row):
+        img_path = self.file_model.paths()[row]
+        if img_path in self.additional_images:
             self.additional_images.remove(img_path)
-            self.list_widget.takeItem(self.list_widget.row(item))
+            self.file_model.remove_row(row)
             self.check_convert_button()
 
     def check_convert_button(self):
-        has_images = (self.list_widget.count() > 0)
-        self.convert_btn.setEnabled(has_images)
+        has_images = (self.file_model.rowCount() > 0)
+        self.convert_btn.setEnabled(has_images and self.worker is None)
         if not has_images:
             self.reset_button_style()
 
-    def calculate_page_size(self, img_width, img_height):
-        """Calculate PDF page size maintaining aspect ratio within constraints"""
-        # Convert from points to mm (1pt = 0.352778mm)
-        min_width_mm = self.MIN_WIDTH * 0.352778
-        max_width_mm = self.MAX_WIDTH * 0.352778
-        
-        # Original dimensions in mm (assuming 72dpi)
-        width_mm = img_width * 0.352778
-        height_mm = img_height * 0.352778
-        
-        # Adjust width if needed
-        if width_mm < min_width_mm:
-            scale_factor = min_width_mm / width_mm
-            width_mm = min_width_mm
-            height_mm *= scale_factor
-        elif width_mm > max_width_mm:
-            scale_factor = max_width_mm / width_mm
-            width_mm = max_width_mm
-            height_mm *= scale_factor
-        
-        return width_mm, height_mm
-
     def convert_images_to_pdf(self):
-        if self.list_widget.count() == 0:
+        # Process all images in list order
+        image_paths = self.file_model.paths()
+        if not image_paths:
+            return
+
+        # Determine output directory
+        if self.selected_folder:
+            output_dir = self.selected_folder
+        elif self.additional_images:
+            output_dir = os.path.dirname(self.additional_images[0])
+        else:
+            QMessageBox.warning(self, "Error", "No output directory available")
             return
-            
-        try:
-            # Determine output directory
-            if self.selected_folder:
-                output_dir = self.selected_folder
-            elif self.additional_images:
-                output_dir = os.path.dirname(self.additional_images[0])
-            else:
-                QMessageBox.warning(self, "Error", "No output directory available")
+
+        output_path = os.path.join(output_dir, "output.pdf")
+
+        # Check if file exists
+        if os.path.exists(output_path):
+            reply = QMessageBox.question(
+                self, "File Exists", 
+                "output.pdf already exists. Overwrite?",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reply == QMessageBox.No:
                 return
-                
-            output_path = os.path.join(output_dir, "output.pdf")
-            
-            # Check if file exists
-            if os.path.exists(output_path):
-                reply = QMessageBox.question(
-                    self, "File Exists", 
-                    "output.pdf already exists. Overwrite?",
-                    QMessageBox.Yes | QMessageBox.No
-                )
-                if reply == QMessageBox.No:
-                    return
-            
-            # Update UI for processing
-            self.convert_btn.setEnabled(False)
-            self.convert_btn.setText("Processing...")
-            QApplication.processEvents()
-            
-            # Create PDF
-            pdf = FPDF(unit="pt")
-            pdf.set_auto_page_break(False)
-            
-            # Process all images in list order
-            for i in range(self.list_widget.count()):
-                item = self.list_widget.item(i)
-                img_path, _ = item.data(Qt.UserRole)
-                
-                with Image.open(img_path) as img:
-                    img_width, img_height = img.size
-                    
-                    # Calculate page size within constraints
-                    page_width, page_height = self.calculate_page_size(img_width, img_height)
-                    
-                    # Convert back to points for FPDF
-                    page_width_pt = page_width / 0.352778
-                    page_height_pt = page_height / 0.352778
-                    
-                    # Create page with calculated size
-                    pdf.add_page(format=(page_width_pt, page_height_pt))
-                    
-                    # Add image maintaining aspect ratio
-                    pdf.image(img_path, 0, 0, page_width_pt, page_height_pt)
-            
-            # Save PDF
-            pdf.output(output_path)
-            
-            # Update UI
-            self.convert_btn.setText("Conversion Complete!")
-            self.convert_btn.setStyleSheet("background-color: green; color: white;")
-            QMessageBox.information(self, "Success", 
-                                  f"PDF created successfully at:\n{output_path}")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An error occurred:\n{str(e)}")
-        finally:
-            self.reset_button_style()
+
+        # Update UI for processing
+        self.convert_btn.setEnabled(False)
+        self.convert_btn.setText("Processing...")
+        self.cancel_btn.setEnabled(True)
+        self.progress_bar.setValue(0)
+
+        self.worker = ImageToPdfWorker(image_paths, output_path,
+                                       linearize=self.linearize_check.isChecked(),
+                                       min_width=self.MIN_WIDTH, max_width=self.MAX_WIDTH,
+                                       preprocess=self.preprocess_check.isChecked(),
+                                       target_dpi=self.target_dpi_input.value(),
+                                       jpeg_quality=self.jpeg_quality_input.value(),
+                                       processes=self.processes_input.value(),
+                                       streaming=self.streaming_check.isChecked())
+        self.worker.progress_updated.connect(self.update_progress)
+        self.worker.finished.connect(self.conversion_complete)
+        self.worker.error_occurred.connect(self.show_error)
+        self.worker.cancelled.connect(self.conversion_cancelled)
+        self.worker.start()
+
+    def cancel_conversion(self):
+        if self.worker:
+            self.worker.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.status_label.setText("Cancelling...")
+
+    def update_progress(self, value, status):
+        self.progress_bar.setValue(value)
+        self.status_label.setText(status)
+
+    def conversion_complete(self, output_path):
+        self.convert_btn.setText("Conversion Complete!")
+        self.convert_btn.setStyleSheet("background-color: green; color: white;")
+        message = (f"PDF created successfully at:\n{output_path}\n\n"
+                   f"Passed through: {self.worker.passthrough_bytes / 1048576:.1f} MB\n"
+                   f"Re-encoded: {self.worker.reencoded_bytes / 1048576:.1f} MB "
+                   f"({self.worker.reencoded_images} images)\n"
+                   f"Duplicates shared: {self.worker.duplicates}, "
+                   f"saved {self.worker.bytes_saved / 1024:.0f} KB")
+        QMessageBox.information(self, "Success", message)
+        self.worker_done()
+
+    def conversion_cancelled(self):
+        self.status_label.setText("Cancelled")
+        self.progress_bar.setValue(0)
+        self.worker_done()
+
+    def show_error(self, error_msg):
+        QMessageBox.critical(self, "Error", f"An error occurred:\n{error_msg}")
+        self.status_label.setText("Failed")
+        self.progress_bar.setValue(0)
+        self.worker_done()
+
+    def worker_done(self):
+        # Signals are emitted from inside run(); let the thread return
+        # before it is deleted
+        self.worker.wait()
+        self.worker.deleteLater()
+        self.worker = None
+        self.cancel_btn.setEnabled(False)
+        self.reset_button_style()
 
     def reset_button_style(self):
         self.convert_btn.setStyleSheet("")
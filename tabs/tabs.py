@@ -1,11 +1,14 @@
 
 import os
-from workers.workers import (PdfToImageWorker, ImageResizerWorker) 
+import time
+from workers.workers import (PdfToImageWorker, ImageResizerPool,
+                             IMAGE_FORMATS, COLOR_MODES, ENCODER_PROFILES)
+from workers.render_cache import RenderCache
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QLineEdit, QPushButton, QFileDialog, QProgressBar, QMessageBox,
-                             QSpinBox, QGroupBox, QRadioButton, QButtonGroup, QListWidget)
+                             QSpinBox, QGroupBox, QRadioButton, QButtonGroup, QListWidget,
+                             QCheckBox, QComboBox)
 from PyQt5.QtGui import  QIcon
-from PIL import Image
 from fpdf import FPDF
 
 class PdfToImageTab(QWidget):
@@ -13,6 +16,7 @@ class PdfToImageTab(QWidget):
         super().__init__(parent)
         self.poppler_path = None
         self.parent = parent
+        self.render_cache = None
         self.init_ui()
         self.auto_detect_poppler()
 
@@ -43,6 +47,41 @@ class PdfToImageTab(QWidget):
         pages_group.setLayout(pages_layout)
         layout.addWidget(pages_group)
 
+        # Image Options
+        image_group = QGroupBox("Image Options")
+        image_layout = QHBoxLayout()
+
+        self.format_input = QComboBox()
+        self.format_input.addItems(IMAGE_FORMATS.keys())
+
+        self.dpi_input = QSpinBox()
+        self.dpi_input.setRange(36, 1200)
+        self.dpi_input.setValue(300)
+
+        self.color_mode_input = QComboBox()
+        self.color_mode_input.addItems(COLOR_MODES.keys())
+
+        self.profile_input = QComboBox()
+        self.profile_input.addItems(ENCODER_PROFILES.keys())
+        self.profile_input.setCurrentText("balanced")
+
+        image_layout.addWidget(QLabel("Format:"))
+        image_layout.addWidget(self.format_input)
+        image_layout.addWidget(QLabel("DPI:"))
+        image_layout.addWidget(self.dpi_input)
+        image_layout.addWidget(QLabel("Colour:"))
+        image_layout.addWidget(self.color_mode_input)
+        image_layout.addWidget(QLabel("Encoder:"))
+        image_layout.addWidget(self.profile_input)
+        image_group.setLayout(image_layout)
+        layout.addWidget(image_group)
+
+        self.direct_check = QCheckBox("Direct to disk (poppler writes the files, PNG/JPEG/TIFF only)")
+        layout.addWidget(self.direct_check)
+
+        self.extract_check = QCheckBox("Extract embedded images losslessly from scanned pages")
+        layout.addWidget(self.extract_check)
+
         # Output Directory
         output_group = QGroupBox("Output Settings")
         output_layout = QVBoxLayout()
@@ -54,6 +93,57 @@ class PdfToImageTab(QWidget):
         
         output_layout.addWidget(self.output_dir_label)
         output_layout.addWidget(output_dir_btn)
+
+        # Streaming mode renders a few pages at a time to bound memory use
+        streaming_layout = QHBoxLayout()
+        self.streaming_check = QCheckBox("Streaming mode (low memory)")
+        self.memory_budget_input = QSpinBox()
+        self.memory_budget_input.setRange(32, 16384)
+        self.memory_budget_input.setValue(256)
+        self.memory_budget_input.setSuffix(" MB")
+        self.memory_budget_input.setEnabled(False)
+        self.streaming_check.toggled.connect(self.memory_budget_input.setEnabled)
+        streaming_layout.addWidget(self.streaming_check)
+        streaming_layout.addWidget(QLabel("Memory budget:"))
+        streaming_layout.addWidget(self.memory_budget_input)
+        streaming_layout.addStretch()
+        output_layout.addLayout(streaming_layout)
+
+        # Parallel mode shards the pages across several poppler/encoder processes
+        parallel_layout = QHBoxLayout()
+        self.parallel_check = QCheckBox("Parallel rendering")
+        self.processes_input = QSpinBox()
+        self.processes_input.setRange(1, 256)
+        self.processes_input.setValue(os.cpu_count() or 1)
+        self.processes_input.setEnabled(False)
+        self.parallel_check.toggled.connect(self.processes_input.setEnabled)
+        parallel_layout.addWidget(self.parallel_check)
+        parallel_layout.addWidget(QLabel("Processes:"))
+        parallel_layout.addWidget(self.processes_input)
+        parallel_layout.addStretch()
+        output_layout.addLayout(parallel_layout)
+
+        # Render cache serves pages exported before with the same settings
+        cache_layout = QHBoxLayout()
+        self.cache_check = QCheckBox("Use render cache")
+        self.cache_size_input = QSpinBox()
+        self.cache_size_input.setRange(64, 102400)
+        self.cache_size_input.setValue(1024)
+        self.cache_size_input.setSuffix(" MB")
+        self.cache_size_input.setEnabled(False)
+        self.cache_check.toggled.connect(self.cache_size_input.setEnabled)
+        clear_cache_btn = QPushButton("Clear Cache")
+        clear_cache_btn.clicked.connect(self.clear_render_cache)
+        cache_layout.addWidget(self.cache_check)
+        cache_layout.addWidget(QLabel("Size cap:"))
+        cache_layout.addWidget(self.cache_size_input)
+        cache_layout.addWidget(clear_cache_btn)
+        cache_layout.addStretch()
+        output_layout.addLayout(cache_layout)
+
+        self.cache_stats_label = QLabel("Cache: 0 hits, 0 misses")
+        output_layout.addWidget(self.cache_stats_label)
+
         output_group.setLayout(output_layout)
         layout.addWidget(output_group)
 
@@ -143,7 +233,27 @@ class PdfToImageTab(QWidget):
 
         self.progress_bar.setValue(0)
 
-        self.worker = PdfToImageWorker(pdf_path, pages, output_dir, self.poppler_path)
+        cache = None
+        if self.cache_check.isChecked():
+            if self.render_cache is None:
+                self.render_cache = RenderCache()
+            self.render_cache.max_size = self.cache_size_input.value() * 1024 * 1024
+            cache = self.render_cache
+
+        self.worker = PdfToImageWorker(
+            pdf_path, pages, output_dir, self.poppler_path,
+            streaming=self.streaming_check.isChecked(),
+            memory_budget_mb=self.memory_budget_input.value(),
+            parallel=self.parallel_check.isChecked(),
+            processes=self.processes_input.value(),
+            image_format=self.format_input.currentText(),
+            dpi=self.dpi_input.value(),
+            color_mode=self.color_mode_input.currentText(),
+            profile=self.profile_input.currentText(),
+            direct=self.direct_check.isChecked(),
+            cache=cache,
+            extract_images=self.extract_check.isChecked()
+        )
         self.worker.progress_updated.connect(self.update_progress)
         self.worker.finished.connect(self.conversion_complete)
         self.worker.error_occurred.connect(self.show_error)
@@ -152,7 +262,25 @@ class PdfToImageTab(QWidget):
     def update_progress(self, value):
         self.progress_bar.setValue(value)
 
+    def update_cache_stats(self):
+        if self.render_cache:
+            self.cache_stats_label.setText(
+                f"Cache: {self.render_cache.hits} hits, {self.render_cache.misses} misses")
+        else:
+            self.cache_stats_label.setText("Cache: 0 hits, 0 misses")
+
+    def clear_render_cache(self):
+        if self.render_cache is None:
+            self.render_cache = RenderCache()
+        self.render_cache.clear()
+        self.update_cache_stats()
+
     def conversion_complete(self, saved_files):
+        self.update_cache_stats()
+        if not saved_files:
+            QMessageBox.warning(self, "Error", "None of the requested pages exist in this PDF")
+            self.progress_bar.setValue(0)
+            return
         QMessageBox.information(
             self, "Success",
             f"Successfully exported {len(saved_files)} pages to:\n{os.path.dirname(saved_files[0])}"
@@ -169,8 +297,8 @@ class PdfToImageTab(QWidget):
 class ImageResizerTab(QWidget):
     def __init__(self):
         super().__init__()
-        self.workers = []
-        self.running_workers = 0
+        self.pool = None
+        self.errors = []
         self.init_ui()
 
     def init_ui(self):
@@ -210,13 +338,16 @@ class ImageResizerTab(QWidget):
         pixel_method = QRadioButton("Resize by Pixels")
         pixel_method.setChecked(True)
         percent_method = QRadioButton("Resize by Percentage")
+        size_set_method = QRadioButton("Size Set")
         
         self.method_group.addButton(pixel_method, 0)
         self.method_group.addButton(percent_method, 1)
+        self.method_group.addButton(size_set_method, 2)
         
         method_layout = QHBoxLayout()
         method_layout.addWidget(pixel_method)
         method_layout.addWidget(percent_method)
+        method_layout.addWidget(size_set_method)
         resize_layout.addLayout(method_layout)
         
         self.pixel_controls = QWidget()
@@ -262,9 +393,40 @@ class ImageResizerTab(QWidget):
         self.percent_controls.setLayout(percent_layout)
         resize_layout.addWidget(self.percent_controls)
         self.percent_controls.setVisible(False)
+
+        self.size_set_controls = QWidget()
+        size_set_layout = QVBoxLayout()
+        self.size_set_input = QLineEdit("2048,1024,512,256")
+        self.size_set_input.setPlaceholderText("Widths separated by commas (e.g., 2048,1024,512)")
+        size_set_layout.addWidget(QLabel("Output widths (one decode, files named <name>_w<width>):"))
+        size_set_layout.addWidget(self.size_set_input)
+        self.size_set_controls.setLayout(size_set_layout)
+        resize_layout.addWidget(self.size_set_controls)
+        self.size_set_controls.setVisible(False)
         
+        quality_layout = QHBoxLayout()
+        quality_layout.addWidget(QLabel("Quality:"))
+        self.quality_input = QComboBox()
+        self.quality_input.addItem("Exact (full decode)", "exact")
+        self.quality_input.addItem("Fast (draft decode + reduce)", "fast")
+        quality_layout.addWidget(self.quality_input)
+        quality_layout.addStretch()
+        resize_layout.addLayout(quality_layout)
+
+        # Very large sources are decoded strip by strip to bound memory use
+        tiled_layout = QHBoxLayout()
+        tiled_layout.addWidget(QLabel("Tiled mode above:"))
+        self.tiled_threshold_input = QSpinBox()
+        self.tiled_threshold_input.setRange(1, 100000)
+        self.tiled_threshold_input.setValue(100)
+        self.tiled_threshold_input.setSuffix(" MP")
+        tiled_layout.addWidget(self.tiled_threshold_input)
+        tiled_layout.addStretch()
+        resize_layout.addLayout(tiled_layout)
+
         pixel_method.toggled.connect(lambda: self.toggle_resize_method(0))
         percent_method.toggled.connect(lambda: self.toggle_resize_method(1))
+        size_set_method.toggled.connect(lambda: self.toggle_resize_method(2))
         
         resize_group.setLayout(resize_layout)
         layout.addWidget(resize_group)
@@ -280,9 +442,67 @@ class ImageResizerTab(QWidget):
         
         output_layout.addWidget(self.output_dir_label)
         output_layout.addWidget(output_dir_btn)
+
+        jobs_layout = QHBoxLayout()
+        jobs_layout.addWidget(QLabel("Parallel jobs:"))
+        self.jobs_input = QSpinBox()
+        self.jobs_input.setRange(1, 256)
+        self.jobs_input.setValue(os.cpu_count() or 1)
+        jobs_layout.addWidget(self.jobs_input)
+        jobs_layout.addStretch()
+        output_layout.addLayout(jobs_layout)
+
         output_group.setLayout(output_layout)
         layout.addWidget(output_group)
 
+        # Encoding Options
+        encoding_group = QGroupBox("Encoding Options")
+        encoding_layout = QVBoxLayout()
+
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("Output format:"))
+        self.output_format_input = QComboBox()
+        self.output_format_input.addItem("Same as input", None)
+        for image_format in IMAGE_FORMATS:
+            self.output_format_input.addItem(image_format, image_format)
+        format_layout.addWidget(self.output_format_input)
+        self.keep_metadata_check = QCheckBox("Keep metadata (EXIF, ICC)")
+        self.keep_metadata_check.setChecked(True)
+        format_layout.addWidget(self.keep_metadata_check)
+        format_layout.addStretch()
+        encoding_layout.addLayout(format_layout)
+
+        jpeg_layout = QHBoxLayout()
+        jpeg_layout.addWidget(QLabel("JPEG/WebP quality:"))
+        self.jpeg_quality_input = QSpinBox()
+        self.jpeg_quality_input.setRange(1, 100)
+        self.jpeg_quality_input.setValue(90)
+        jpeg_layout.addWidget(self.jpeg_quality_input)
+        self.jpeg_progressive_check = QCheckBox("Progressive")
+        jpeg_layout.addWidget(self.jpeg_progressive_check)
+        self.jpeg_optimize_check = QCheckBox("Optimize")
+        self.jpeg_optimize_check.setChecked(True)
+        jpeg_layout.addWidget(self.jpeg_optimize_check)
+        jpeg_layout.addStretch()
+        encoding_layout.addLayout(jpeg_layout)
+
+        level_layout = QHBoxLayout()
+        level_layout.addWidget(QLabel("PNG compress level:"))
+        self.png_level_input = QSpinBox()
+        self.png_level_input.setRange(0, 9)
+        self.png_level_input.setValue(6)
+        level_layout.addWidget(self.png_level_input)
+        level_layout.addWidget(QLabel("WebP method:"))
+        self.webp_method_input = QSpinBox()
+        self.webp_method_input.setRange(0, 6)
+        self.webp_method_input.setValue(4)
+        level_layout.addWidget(self.webp_method_input)
+        level_layout.addStretch()
+        encoding_layout.addLayout(level_layout)
+
+        encoding_group.setLayout(encoding_layout)
+        layout.addWidget(encoding_group)
+
         # Progress Bar
         self.progress_bar = QProgressBar()
         self.progress_bar.setRange(0, 100)
@@ -303,6 +523,7 @@ class ImageResizerTab(QWidget):
     def toggle_resize_method(self, method):
         self.pixel_controls.setVisible(method == 0)
         self.percent_controls.setVisible(method == 1)
+        self.size_set_controls.setVisible(method == 2)
 
     def browse_images(self):
         file_paths, _ = QFileDialog.getOpenFileNames(
@@ -334,6 +555,7 @@ class ImageResizerTab(QWidget):
             QMessageBox.warning(self, "Error", "Please select at least one image file")
             return
 
+        size_set = None
         if self.method_group.checkedId() == 0:  # Pixel method
             width = self.width_input.value()
             height = self.height_input.value()
@@ -341,11 +563,19 @@ class ImageResizerTab(QWidget):
             if width == 0 and height == 0:
                 QMessageBox.warning(self, "Error", "At least one dimension (width or height) must be greater than 0")
                 return
-        else:  # Percentage method
+        elif self.method_group.checkedId() == 1:  # Percentage method
             percent = self.percent_input.value()
             if percent <= 0:
                 QMessageBox.warning(self, "Error", "Percentage must be greater than 0")
                 return
+        else:  # Size set method
+            try:
+                size_set = [int(w.strip()) for w in self.size_set_input.text().split(",") if w.strip()]
+                if not size_set or min(size_set) <= 0:
+                    raise ValueError("Enter at least one width greater than 0")
+            except ValueError as e:
+                QMessageBox.warning(self, "Error", f"Invalid size set: {str(e)}")
+                return
 
         output_dir = self.custom_output_dir if self.custom_output_dir else os.path.dirname(self.file_list.item(0).text())
         if not os.path.exists(output_dir):
@@ -354,51 +584,75 @@ class ImageResizerTab(QWidget):
         self.progress_bar.setValue(0)
         self.resize_btn.setEnabled(False)
         self.status_label.setText("Processing...")
-        self.running_workers = 0
+        self.errors = []
 
-        # Process all selected files
-        for i in range(self.file_list.count()):
-            image_path = self.file_list.item(i).text()
-            
-            if self.method_group.checkedId() == 0:  # Pixel method
-                width = self.width_input.value()
-                height = self.height_input.value()
-            else:  # Percentage method
-                percent = self.percent_input.value()
-                # Get original dimensions for percentage calculation
-                with Image.open(image_path) as img:
-                    original_width, original_height = img.size
-                    width = int(original_width * percent / 100)
-                    height = int(original_height * percent / 100)
-
-            worker = ImageResizerWorker(image_path, output_dir, width, height)
-            worker.progress_updated.connect(self.update_progress)
-            worker.finished.connect(self.resize_complete)
-            worker.error_occurred.connect(self.show_error)
-            
-            self.workers.append(worker)
-            self.running_workers += 1
-            worker.start()
+        # Collect all selected files as jobs for the pool. In percentage mode
+        # the pool reads each image's size itself, off the GUI thread
+        percent = None
+        if self.method_group.checkedId() == 0:  # Pixel method
+            width = self.width_input.value()
+            height = self.height_input.value()
+        elif self.method_group.checkedId() == 1:  # Percentage method
+            percent = self.percent_input.value()
+            width = height = 0
+        else:  # Size set method
+            width = height = 0
+
+        jobs = [(self.file_list.item(i).text(), width, height)
+                for i in range(self.file_list.count())]
+
+        self.pool = ImageResizerPool(jobs, output_dir, self.jobs_input.value(),
+                                     percent=percent,
+                                     quality=self.quality_input.currentData(),
+                                     size_set=size_set,
+                                     image_format=self.output_format_input.currentData(),
+                                     encoder_options=self.encoder_options(),
+                                     keep_metadata=self.keep_metadata_check.isChecked(),
+                                     tiled_threshold=self.tiled_threshold_input.value() * 1000000)
+        self.start_time = time.perf_counter()
+        self.pool.progress_updated.connect(self.update_progress)
+        self.pool.error_occurred.connect(self.show_error)
+        self.pool.finished.connect(self.all_processes_complete)
+        self.pool.start()
+
+    def encoder_options(self):
+        return {
+            "JPEG": {
+                "quality": self.jpeg_quality_input.value(),
+                "progressive": self.jpeg_progressive_check.isChecked(),
+                "optimize": self.jpeg_optimize_check.isChecked(),
+            },
+            "PNG": {"compress_level": self.png_level_input.value()},
+            "WEBP": {
+                "quality": self.jpeg_quality_input.value(),
+                "method": self.webp_method_input.value(),
+            },
+            "TIFF": ENCODER_PROFILES["balanced"]["TIFF"],
+        }
 
     def update_progress(self, value, filename):
-        # Update progress for individual files
+        # Overall progress across all files
         base_name = os.path.basename(filename)
-        self.status_label.setText(f"Processing: {base_name}... ({value}%)")
+        self.status_label.setText(f"Processed: {base_name} ({value}%)")
         self.progress_bar.setValue(value)
 
-    def resize_complete(self, output_path):
-        self.running_workers -= 1
-        if self.running_workers <= 0:
-            self.all_processes_complete()
-
     def show_error(self, error_msg, filename):
-        self.running_workers -= 1
-        QMessageBox.critical(self, "Error", f"Failed to process {filename}:\n{error_msg}")
-        if self.running_workers <= 0:
-            self.all_processes_complete()
-
-    def all_processes_complete(self):
+        self.errors.append(f"{os.path.basename(filename)}: {error_msg}")
+
+    def all_processes_complete(self, output_paths):
+        # finished is emitted from inside run(); let the thread return
+        # before it is deleted
+        self.pool.wait()
+        self.pool.deleteLater()
+        self.pool = None
         self.progress_bar.setValue(100)
         self.resize_btn.setEnabled(True)
-        self.status_label.setText("All operations completed")
-        QMessageBox.information(self, "Complete", "All images have been processed")
\ No newline at end of file
+        elapsed = time.perf_counter() - self.start_time
+        self.status_label.setText(
+            f"All operations completed in {elapsed:.1f}s ({self.quality_input.currentText()})")
+        if self.errors:
+            QMessageBox.critical(self, "Error",
+                                 f"Failed to process {len(self.errors)} image(s):\n"
+                                 + "\n".join(self.errors[:20]))
+        QMessageBox.information(self, "Complete",
+                                f"{len(output_paths)} images have been processed")
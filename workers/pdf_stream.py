@@ -0,0 +1,284 @@
+import io
+import hashlib
+from PyPDF2.generic import (ArrayObject, BooleanObject, DecodedStreamObject, DictionaryObject,
+                            EncodedStreamObject, FloatObject, IndirectObject, NameObject,
+                            NullObject, NumberObject, StreamObject)
+
+
+def decode_parms(dp):
+    """Parse a decode parameter string such as "/Predictor 15 /Columns 20" """
+    tokens = dp.split()
+    parms = DictionaryObject()
+    for key, value in zip(tokens[::2], tokens[1::2]):
+        if value in ("true", "false"):
+            parms[NameObject(key)] = BooleanObject(value == "true")
+        else:
+            parms[NameObject(key)] = NumberObject(int(value))
+    return parms
+
+
+class StreamingPdfWriter:
+    """Write a PDF incrementally, copying pages and the objects they use
+    straight to disk instead of building the whole document in memory"""
+
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self, output_path, dedupe=False):
+        self.stream = open(output_path, "wb")
+        self.stream.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        self.offsets = {}
+        self.next_number = 3
+        self.page_numbers = []
+        self.bytes_written = 0
+        # With dedupe, identical streams (fonts, images, ICC profiles) from any
+        # input are written once; keyed by a hash of the serialized stream
+        self.dedupe = dedupe
+        self.stream_hashes = {}
+        self.duplicates = 0
+        self.bytes_saved = 0
+
+    def allocate(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def write_object(self, number, obj):
+        self.offsets[number] = self.stream.tell()
+        self.stream.write(f"{number} 0 obj\n".encode())
+        obj.write_to_stream(self.stream, None)
+        self.stream.write(b"\nendobj\n")
+
+    def write_shared_stream(self, stream_object):
+        """Write a stream unless an identical one exists, returns its number"""
+        buffer = io.BytesIO()
+        self.copy(stream_object).write_to_stream(buffer, None)
+        data = buffer.getvalue()
+
+        digest = hashlib.sha256(data).digest()
+        if digest in self.stream_hashes:
+            self.duplicates += 1
+            self.bytes_saved += len(data)
+            return self.stream_hashes[digest]
+
+        number = self.allocate()
+        self.offsets[number] = self.stream.tell()
+        self.stream.write(f"{number} 0 obj\n".encode())
+        self.stream.write(data)
+        self.stream.write(b"\nendobj\n")
+        self.stream_hashes[digest] = number
+        return number
+
+    def add_reader(self, reader, progress=None, page_indices=None):
+        """Copy the pages of reader (all, or the given 0-based indices);
+        progress is called after each page"""
+        # Object numbers of one input; shared resources are written once per file
+        self.object_numbers = {}
+        self.queue = []
+        self.in_progress = set()
+
+        # Pages get their numbers up front so links and annotations between
+        # pages of the same file resolve to the copies
+        self.source_pages = {}
+        if page_indices is None:
+            pages = list(reader.pages)
+        else:
+            pages = [reader.pages[index] for index in page_indices]
+        for page in pages:
+            reference = page.indirect_reference
+            number = self.allocate()
+            if reference is not None:
+                self.source_pages[(reference.idnum, reference.generation)] = number
+            self.page_numbers.append(number)
+
+        first = len(self.page_numbers) - len(pages)
+        for index, page in enumerate(pages):
+            page_copy = DictionaryObject()
+            for key, value in page.items():
+                if key != "/Parent":
+                    page_copy[NameObject(key)] = self.copy(value)
+            page_copy[NameObject("/Parent")] = IndirectObject(self.PAGES, 0, None)
+            self.write_object(self.page_numbers[first + index], page_copy)
+
+            # Write everything the page references before moving on
+            while self.queue:
+                reference, number = self.queue.pop()
+                self.write_object(number, self.copy(reference.get_object()))
+
+            # Objects are on disk now; drop the reader's parsed copies
+            if hasattr(reader, "resolved_objects"):
+                reader.resolved_objects.clear()
+            if progress:
+                progress(index + 1, len(pages))
+
+        self.object_numbers = None
+        self.source_pages = None
+
+    def write_raw_stream(self, data, entries):
+        """Write already encoded stream data with the given dictionary entries"""
+        stream = EncodedStreamObject()
+        stream._data = data
+        for key, value in entries.items():
+            stream[NameObject(key)] = value
+        number = self.allocate()
+        self.write_object(number, stream)
+        return number
+
+    def write_image(self, info):
+        """Write an image XObject from fpdf's parsed image info, returns its number"""
+        entries = {
+            "/Type": NameObject("/XObject"),
+            "/Subtype": NameObject("/Image"),
+            "/Width": NumberObject(info["w"]),
+            "/Height": NumberObject(info["h"]),
+            "/BitsPerComponent": NumberObject(info["bpc"]),
+            "/Filter": NameObject("/" + info["f"]),
+        }
+        if info["cs"] == "Indexed":
+            palette = self.write_raw_stream(info["pal"], {})
+            entries["/ColorSpace"] = ArrayObject([
+                NameObject("/Indexed"), NameObject("/DeviceRGB"),
+                NumberObject(len(info["pal"]) // 3 - 1), IndirectObject(palette, 0, None)])
+        elif info.get("iccp"):
+            # Photos from one camera share a profile, so it is written once
+            profile = EncodedStreamObject()
+            profile._data = info["iccp"]
+            profile[NameObject("/N")] = NumberObject(info["dpn"])
+            profile[NameObject("/Alternate")] = NameObject("/" + info["cs"])
+            entries["/ColorSpace"] = ArrayObject([
+                NameObject("/ICCBased"), IndirectObject(self.write_shared_stream(profile), 0, None)])
+        else:
+            entries["/ColorSpace"] = NameObject("/" + info["cs"])
+            if info["cs"] == "DeviceCMYK" and info["inverted"]:
+                entries["/Decode"] = ArrayObject(NumberObject(n) for n in (1, 0) * 4)
+
+        if info["f"] == "FlateDecode":
+            entries["/DecodeParms"] = decode_parms(f"{info['dp']} /BitsPerComponent {info['bpc']}")
+        elif info["f"] == "CCITTFaxDecode":
+            entries["/DecodeParms"] = decode_parms(info["dp"])
+
+        if "smask" in info:
+            smask = self.write_raw_stream(info["smask"], {
+                "/Type": NameObject("/XObject"),
+                "/Subtype": NameObject("/Image"),
+                "/Width": NumberObject(info["w"]),
+                "/Height": NumberObject(info["h"]),
+                "/ColorSpace": NameObject("/DeviceGray"),
+                "/BitsPerComponent": NumberObject(8),
+                "/Filter": NameObject("/" + info["f"]),
+                "/DecodeParms": decode_parms(
+                    f"/Predictor 15 /Colors 1 /Columns {info['w']} /BitsPerComponent 8"),
+            })
+            entries["/SMask"] = IndirectObject(smask, 0, None)
+
+        return self.write_raw_stream(info["data"], entries)
+
+    def add_image_page(self, image_number, page_width, page_height):
+        """Add a page showing the image XObject image_number scaled to fill it"""
+        content = f"q {page_width:.2f} 0 0 {page_height:.2f} 0 0 cm /I0 Do Q".encode()
+        contents = self.write_raw_stream(content, {})
+
+        page = DictionaryObject({
+            NameObject("/Type"): NameObject("/Page"),
+            NameObject("/Parent"): IndirectObject(self.PAGES, 0, None),
+            NameObject("/MediaBox"): ArrayObject([
+                NumberObject(0), NumberObject(0),
+                FloatObject(f"{page_width:.2f}"), FloatObject(f"{page_height:.2f}")]),
+            NameObject("/Resources"): DictionaryObject({
+                NameObject("/XObject"): DictionaryObject({
+                    NameObject("/I0"): IndirectObject(image_number, 0, None)}),
+            }),
+            NameObject("/Contents"): IndirectObject(contents, 0, None),
+        })
+        number = self.allocate()
+        self.write_object(number, page)
+        self.page_numbers.append(number)
+
+    def map_reference(self, reference):
+        key = (reference.idnum, reference.generation)
+        if key in self.source_pages:
+            return IndirectObject(self.source_pages[key], 0, None)
+        if key not in self.object_numbers:
+            target = reference.get_object()
+            # Never follow references into the source page tree or to pages
+            # that are not being copied
+            if target is None or (isinstance(target, DictionaryObject)
+                                  and target.get("/Type") in ("/Pages", "/Page")):
+                return NullObject()
+            if self.dedupe and isinstance(target, StreamObject) and key not in self.in_progress:
+                # Streams are copied eagerly so their references are already
+                # renumbered (and deduplicated) when the stream is hashed
+                self.in_progress.add(key)
+                self.object_numbers[key] = self.write_shared_stream(target)
+                self.in_progress.discard(key)
+            else:
+                self.object_numbers[key] = self.allocate()
+                self.queue.append((reference, self.object_numbers[key]))
+        return IndirectObject(self.object_numbers[key], 0, None)
+
+    def copy(self, obj):
+        """Copy a direct object, renumbering any indirect references inside it"""
+        if isinstance(obj, IndirectObject):
+            return self.map_reference(obj)
+        if isinstance(obj, StreamObject):
+            # Encoded streams are copied byte for byte, never decoded
+            if isinstance(obj, EncodedStreamObject):
+                stream_copy = EncodedStreamObject()
+                stream_copy._data = obj._data
+            else:
+                stream_copy = DecodedStreamObject()
+                stream_copy.set_data(obj.get_data())
+            for key, value in obj.items():
+                # /Length is rewritten from the data when the stream is written
+                if key != "/Length":
+                    stream_copy[NameObject(key)] = self.copy(value)
+            return stream_copy
+        if isinstance(obj, DictionaryObject):
+            dict_copy = DictionaryObject()
+            for key, value in obj.items():
+                dict_copy[NameObject(key)] = self.copy(value)
+            return dict_copy
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self.copy(value) for value in obj)
+        if obj is None:
+            return NullObject()
+        return obj
+
+    def close(self):
+        pages = DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(
+                IndirectObject(number, 0, None) for number in self.page_numbers),
+            NameObject("/Count"): NumberObject(len(self.page_numbers)),
+        })
+        self.write_object(self.PAGES, pages)
+
+        catalog = DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): IndirectObject(self.PAGES, 0, None),
+        })
+        self.write_object(self.CATALOG, catalog)
+
+        xref_offset = self.stream.tell()
+        self.stream.write(f"xref\n0 {self.next_number}\n".encode())
+        self.stream.write(b"0000000000 65535 f \n")
+        for number in range(1, self.next_number):
+            # Every allocated number is normally written; anything missing is
+            # listed as free rather than producing a broken table
+            if number in self.offsets:
+                self.stream.write(f"{self.offsets[number]:010d} 00000 n \n".encode())
+            else:
+                self.stream.write(b"0000000000 65535 f \n")
+
+        trailer = DictionaryObject({
+            NameObject("/Size"): NumberObject(self.next_number),
+            NameObject("/Root"): IndirectObject(self.CATALOG, 0, None),
+        })
+        self.stream.write(b"trailer\n")
+        trailer.write_to_stream(self.stream, None)
+        self.stream.write(f"\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+        self.bytes_written = self.stream.tell()
+        self.stream.close()
+
+    def abort(self):
+        self.stream.close()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import hashlib
+
+
+class RenderCache:
+    """Content-addressed on-disk cache of rendered PDF pages with LRU eviction"""
+
+    def __init__(self, cache_dir=None, max_size_mb=1024):
+        self.cache_dir = cache_dir or os.path.join(
+            os.path.expanduser("~"), ".easy-tools", "render_cache")
+        self.max_size = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def file_hash(path):
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def entry_path(self, pdf_hash, page, dpi, image_format, color_mode, profile):
+        key = f"{pdf_hash}_{page}_{dpi}_{image_format}_{color_mode}_{profile}"
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest())
+
+    @staticmethod
+    def copy_file(source, destination):
+        # Always a fresh inode: output files are later rewritten in place
+        # (e.g. by PIL), which would corrupt a hardlinked cache entry
+        temp_path = f"{destination}.{os.getpid()}.tmp"
+        try:
+            shutil.copyfile(source, temp_path)
+            os.replace(temp_path, destination)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def fetch(self, entry, output_path):
+        """Serve a cached page to output_path, returns False on a miss"""
+        if not os.path.exists(entry):
+            self.misses += 1
+            return False
+
+        # Modification time doubles as the LRU timestamp
+        os.utime(entry)
+        self.copy_file(entry, output_path)
+        self.hits += 1
+        return True
+
+    def store(self, entry, source_path):
+        self.copy_file(source_path, entry)
+        os.utime(entry)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its size cap"""
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            os.remove(os.path.join(self.cache_dir, name))
+        self.hits = 0
+        self.misses = 0
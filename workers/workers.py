@@ -1,97 +1,1334 @@
+import io
 import os
+import re
+import hashlib
+import math
+import shutil
+import time
+import tempfile
+import subprocess
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from PyQt5.QtCore import  QThread, pyqtSignal
 from pdf2image import convert_from_path
-from PIL import Image
+from PIL import Image, ImageOps
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ContentStream
+from fpdf import FPDF
+from fpdf.image_parsing import get_img_info
+from workers.pdf_stream import StreamingPdfWriter
+from workers.render_cache import RenderCache
+
+# Pool processes are spawned, not forked: forking copies the running Qt
+# threads' locks in whatever state they are in
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def page_runs(pages):
+    """Group sorted page numbers into (first, last) contiguous runs"""
+    runs = []
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    return [(first, last) for first, last in runs]
+
+
+def split_runs(runs, shard_size):
+    """Split (first, last) runs so no shard covers more than shard_size pages"""
+    shards = []
+    for first, last in runs:
+        for start in range(first, last + 1, shard_size):
+            shards.append((start, min(last, start + shard_size - 1)))
+    return shards
+
+
+# Output format -> file extension
+IMAGE_FORMATS = {
+    "PNG": ".png",
+    "JPEG": ".jpg",
+    "WEBP": ".webp",
+    "TIFF": ".tif",
+}
+
+# Colour mode label -> PIL mode
+COLOR_MODES = {
+    "RGB": "RGB",
+    "Grayscale": "L",
+    "1-bit": "1",
+}
+
+# Encoder profile -> Pillow save options per format
+ENCODER_PROFILES = {
+    "fastest": {
+        "PNG": {"compress_level": 1},
+        "JPEG": {"quality": 85},
+        "WEBP": {"quality": 80, "method": 0},
+        "TIFF": {"compression": "raw"},
+    },
+    "balanced": {
+        "PNG": {"compress_level": 6},
+        "JPEG": {"quality": 90, "optimize": True},
+        "WEBP": {"quality": 85, "method": 4},
+        "TIFF": {"compression": "tiff_lzw"},
+    },
+    "smallest": {
+        "PNG": {"compress_level": 9, "optimize": True},
+        "JPEG": {"quality": 80, "optimize": True, "progressive": True},
+        "WEBP": {"quality": 80, "method": 6},
+        "TIFF": {"compression": "tiff_adobe_deflate"},
+    },
+}
+
+# Formats poppler can write itself -> pdf2image fmt name
+DIRECT_FORMATS = {
+    "PNG": "png",
+    "JPEG": "jpeg",
+    "TIFF": "tiff",
+}
+
+
+def supports_direct(image_format, color_mode):
+    # pdf2image has no switch for poppler's 1-bit output
+    return image_format in DIRECT_FORMATS and color_mode != "1-bit"
+
+
+def save_image(image, output_path, image_format="PNG", color_mode="RGB", profile="balanced"):
+    """Convert image to the requested colour mode and encode it"""
+    mode = COLOR_MODES[color_mode]
+    # JPEG and WebP have no 1-bit mode, fall back to grayscale
+    if mode == "1" and image_format in ("JPEG", "WEBP"):
+        mode = "L"
+    if image.mode != mode:
+        image = image.convert(mode)
+
+    options = dict(ENCODER_PROFILES[profile][image_format])
+    if image_format == "TIFF" and mode == "1" and profile != "fastest":
+        options["compression"] = "group4"
+    image.save(output_path, image_format, **options)
+
+
+def page_output_path(output_dir, base_name, page_number, image_format="PNG"):
+    return os.path.join(output_dir,
+                        f"{base_name}_page_{page_number}{IMAGE_FORMATS[image_format]}")
+
+
+def render_pages_to_disk(pdf_path, first_page, last_page, output_dir, poppler_path=None,
+                         image_format="PNG", dpi=300, color_mode="RGB", profile="balanced"):
+    """Let poppler write the final files and only rename them into place"""
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    jpegopt = ENCODER_PROFILES[profile]["JPEG"] if image_format == "JPEG" else None
+
+    saved_files = []
+    # Temporary folder inside the output directory keeps the renames on one filesystem
+    with tempfile.TemporaryDirectory(dir=output_dir) as temp_dir:
+        paths = convert_from_path(
+            pdf_path,
+            first_page=first_page,
+            last_page=last_page,
+            dpi=dpi,
+            grayscale=color_mode != "RGB",
+            poppler_path=poppler_path,
+            output_folder=temp_dir,
+            fmt=DIRECT_FORMATS[image_format],
+            jpegopt=jpegopt,
+            paths_only=True
+        )
+        for i, path in enumerate(paths):
+            output_path = page_output_path(output_dir, base_name, first_page + i, image_format)
+            os.replace(path, output_path)
+            saved_files.append(output_path)
+    return saved_files
+
+
+def poppler_command(name, poppler_path=None):
+    return os.path.join(poppler_path, name) if poppler_path else name
+
+
+def page_geometry(pdf_path, first_page, last_page, poppler_path=None):
+    """(width, height, rotation) of pages keyed by page number, read with pdfinfo"""
+    output = subprocess.run(
+        [poppler_command("pdfinfo", poppler_path), "-f", str(first_page),
+         "-l", str(last_page), pdf_path],
+        capture_output=True, text=True, check=True
+    ).stdout
+    sizes = {}
+    for match in re.finditer(r"Page\s+(\d+) size:\s+([\d.]+) x ([\d.]+)", output):
+        sizes[int(match.group(1))] = (float(match.group(2)), float(match.group(3)))
+    rotations = {int(match.group(1)): int(match.group(2)) % 360
+                 for match in re.finditer(r"Page\s+(\d+) rot:\s+(-?\d+)", output)}
+    return {page: (width, height, rotations.get(page, 0))
+            for page, (width, height) in sizes.items()}
+
+
+# Content stream operators that change state or build clipping paths
+# without painting anything
+NON_PAINTING_OPERATORS = {b"q", b"Q", b"cm", b"gs", b"w", b"J", b"j", b"M", b"d", b"ri", b"i",
+                          b"m", b"l", b"c", b"v", b"y", b"h", b"re", b"W", b"W*", b"n"}
+
+
+def draws_only_upright_image(page):
+    """Whether the page's content paints exactly one image XObject, drawn
+    without rotation or flipping, and nothing else"""
+    if "/Annots" in page:
+        return False
+    contents = page.get_contents()
+    if contents is None:
+        return False
+    resources = page.get("/Resources")
+    resources = resources.get_object() if resources is not None else {}
+    xobjects = resources.get("/XObject")
+    xobjects = xobjects.get_object() if xobjects is not None else {}
+
+    matrix = [1, 0, 0, 1, 0, 0]
+    stack = []
+    images = 0
+    for operands, operator in ContentStream(contents, page.pdf).operations:
+        if operator == b"q":
+            stack.append(matrix)
+        elif operator == b"Q":
+            matrix = stack.pop() if stack else [1, 0, 0, 1, 0, 0]
+        elif operator == b"cm":
+            a, b, c, d, e, f = (float(value) for value in operands)
+            m = matrix
+            matrix = [a * m[0] + b * m[2], a * m[1] + b * m[3],
+                      c * m[0] + d * m[2], c * m[1] + d * m[3],
+                      e * m[0] + f * m[2] + m[4], e * m[1] + f * m[3] + m[5]]
+        elif operator == b"Do":
+            xobject = xobjects.get(operands[0])
+            if xobject is None or xobject.get_object().get("/Subtype") != "/Image":
+                return False
+            # The stored image is only upright if it is scaled, not rotated
+            # or mirrored
+            if matrix[1] or matrix[2] or matrix[0] <= 0 or matrix[3] <= 0:
+                return False
+            images += 1
+        elif operator not in NON_PAINTING_OPERATORS:
+            # Text, vector painting, shadings, inline images, ...
+            return False
+    return images == 1
+
+
+def single_image_pages(pdf_path, pages, poppler_path=None):
+    """Pages whose only content is one upright embedded image covering the page"""
+    first_page, last_page = min(pages), max(pages)
+    output = subprocess.run(
+        [poppler_command("pdfimages", poppler_path), "-list", "-f", str(first_page),
+         "-l", str(last_page), pdf_path],
+        capture_output=True, text=True, check=True
+    ).stdout
+
+    # Columns: page num type width height color comp bpc enc interp object ID x-ppi y-ppi ...
+    page_images = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 14 or not fields[0].isdigit():
+            continue
+        page_images.setdefault(int(fields[0]), []).append(fields)
+
+    geometry = page_geometry(pdf_path, first_page, last_page, poppler_path)
+    candidates = []
+    for page in pages:
+        images = page_images.get(page, [])
+        if len(images) != 1 or images[0][2] != "image" or page not in geometry:
+            continue
+        page_width, page_height, rotation = geometry[page]
+        # Rotated pages are rasterized so they come out upright
+        if rotation:
+            continue
+        width, height, x_ppi, y_ppi = (float(images[0][i]) for i in (3, 4, 12, 13))
+        if not x_ppi or not y_ppi:
+            continue
+        # Drawn size of the image in points must cover (nearly) the whole page
+        if (width / x_ppi * 72 >= page_width * 0.9
+                and height / y_ppi * 72 >= page_height * 0.9):
+            candidates.append(page)
+    if not candidates:
+        return []
+
+    # pdfimages only lists images; text, vectors and the drawing transform
+    # come from the content stream
+    result = []
+    try:
+        reader = PdfReader(pdf_path)
+        if reader.is_encrypted:
+            reader.decrypt("")
+        for page in candidates:
+            if draws_only_upright_image(reader.pages[page - 1]):
+                result.append(page)
+    except Exception:
+        # Anything unreadable is left to the rasterizer
+        return result
+    return result
+
+
+def extract_page_image(pdf_path, page, output_dir, poppler_path=None):
+    """Write the embedded image of a page as-is (JPEG/JPX) or losslessly as PNG"""
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    with tempfile.TemporaryDirectory(dir=output_dir) as temp_dir:
+        subprocess.run(
+            [poppler_command("pdfimages", poppler_path), "-j", "-jp2", "-png",
+             "-f", str(page), "-l", str(page), pdf_path, os.path.join(temp_dir, "img")],
+            capture_output=True, check=True
+        )
+        extracted = os.listdir(temp_dir)
+        if len(extracted) != 1:
+            return None
+        extension = os.path.splitext(extracted[0])[1]
+        output_path = os.path.join(output_dir, f"{base_name}_page_{page}{extension}")
+        os.replace(os.path.join(temp_dir, extracted[0]), output_path)
+    return output_path
+
+
+def render_page_shard(pdf_path, first_page, last_page, output_dir, poppler_path=None,
+                      image_format="PNG", dpi=300, color_mode="RGB", profile="balanced",
+                      direct=False):
+    """Render and save one shard of pages; runs inside a pool process"""
+    if direct:
+        return render_pages_to_disk(pdf_path, first_page, last_page, output_dir, poppler_path,
+                                    image_format, dpi, color_mode, profile)
+
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    images = convert_from_path(
+        pdf_path,
+        first_page=first_page,
+        last_page=last_page,
+        dpi=dpi,
+        grayscale=color_mode != "RGB",
+        poppler_path=poppler_path
+    )
+
+    saved_files = []
+    for i, image in enumerate(images):
+        output_path = page_output_path(output_dir, base_name, first_page + i, image_format)
+        save_image(image, output_path, image_format, color_mode, profile)
+        image.close()
+        saved_files.append(output_path)
+    return saved_files
+
 
 class PdfToImageWorker(QThread):
     progress_updated = pyqtSignal(int)
     finished = pyqtSignal(list)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, pdf_path, pages, output_dir, poppler_path=None):
+    def __init__(self, pdf_path, pages, output_dir, poppler_path=None,
+                 streaming=False, memory_budget_mb=256, parallel=False, processes=None,
+                 image_format="PNG", dpi=300, color_mode="RGB", profile="balanced",
+                 direct=False, cache=None, extract_images=False):
         super().__init__()
         self.pdf_path = pdf_path
         self.pages = pages
         self.output_dir = output_dir
         self.poppler_path = poppler_path
+        self.image_format = image_format
+        self.dpi = dpi
+        self.color_mode = color_mode
+        self.profile = profile
+        # Direct mode has poppler encode the output itself; formats it
+        # cannot write go through the regular PIL path
+        self.direct = direct and supports_direct(image_format, color_mode)
+        self.cache = cache
+        # Scanned pages holding a single image are extracted instead of rasterized
+        self.extract_images = extract_images
+        self.extracted = {}
+        self.streaming = streaming
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        # Pages rendered per poppler call in streaming mode; starts at one
+        # and grows once the size of a rendered page is known
+        self.page_window = 1
+        self.parallel = parallel
+        self.processes = processes or os.cpu_count() or 1
+
+    def update_page_window(self, image):
+        # Raw PPM output from poppler and the decoded PIL image are both
+        # held while a window is processed, so budget for two copies
+        page_bytes = image.width * image.height * len(image.getbands()) * 2
+        self.page_window = max(1, self.memory_budget // page_bytes)
+
+    def emit_progress(self, done_pages):
+        progress = int((self.served_pages + done_pages) / self.total_pages * 100)
+        self.progress_updated.emit(progress)
+
+    def output_path(self, page_number):
+        base_name = os.path.splitext(os.path.basename(self.pdf_path))[0]
+        return page_output_path(self.output_dir, base_name, page_number, self.image_format)
+
+    def cache_entry(self, pdf_hash, page_number):
+        return self.cache.entry_path(pdf_hash, page_number, self.dpi, self.image_format,
+                                     self.color_mode, self.profile)
+
+    def run_parallel(self, requested):
+        # Shards are kept small relative to the pool so progress stays
+        # smooth and no single process holds many decoded pages
+        shard_size = max(1, math.ceil(len(requested) / (self.processes * 4)))
+        shards = split_runs(page_runs(requested), shard_size)
+
+        written = {}
+        with ProcessPoolExecutor(max_workers=min(self.processes, len(shards)),
+                                 mp_context=POOL_CONTEXT) as pool:
+            futures = {
+                pool.submit(render_page_shard, self.pdf_path, first_page, last_page,
+                            self.output_dir, self.poppler_path, self.image_format,
+                            self.dpi, self.color_mode, self.profile, self.direct): first_page
+                for first_page, last_page in shards
+            }
+            for future in as_completed(futures):
+                # Shards past the end of the document come back short or empty
+                written.update(enumerate(future.result(), futures[future]))
+                self.emit_progress(len(written))
+        return written
+
+    def run_serial(self, requested):
+        written = {}
+
+        # Render each contiguous run of requested pages separately so
+        # pages in between are never rasterized
+        for first_page, last_page in page_runs(requested):
+            page = first_page
+            while page <= last_page:
+                # In streaming mode only a bounded window of pages is
+                # decoded at a time; otherwise the whole run is rendered
+                if self.streaming:
+                    window_last = min(last_page, page + self.page_window - 1)
+                else:
+                    window_last = last_page
+
+                if self.direct:
+                    written.update(enumerate(render_pages_to_disk(
+                        self.pdf_path, page, window_last, self.output_dir,
+                        self.poppler_path, self.image_format, self.dpi,
+                        self.color_mode, self.profile
+                    ), page))
+                    self.emit_progress(len(written))
+                    page = window_last + 1
+                    continue
+
+                images = convert_from_path(
+                    self.pdf_path,
+                    first_page=page,
+                    last_page=window_last,
+                    dpi=self.dpi,
+                    grayscale=self.color_mode != "RGB",
+                    poppler_path=self.poppler_path
+                )
+
+                for i, image in enumerate(images):
+                    save_image(image, self.output_path(page + i), self.image_format,
+                               self.color_mode, self.profile)
+                    written[page + i] = self.output_path(page + i)
+                    self.emit_progress(len(written))
+
+                if self.streaming and images:
+                    self.update_page_window(images[0])
+                    for image in images:
+                        image.close()
+                del images
+
+                page = window_last + 1
+        return written
 
     def run(self):
         try:
-            # Convert specified pages
-            images = convert_from_path(
-                self.pdf_path,
-                first_page=min(self.pages),
-                last_page=max(self.pages),
-                dpi=300,
-                poppler_path=self.poppler_path
-            )
-            
-            saved_files = []
-            total_pages = len(images)
-            for i, image in enumerate(images):
-                # Only save the pages that were requested
-                actual_page_number = i + min(self.pages)
-                if actual_page_number in self.pages:
-                    output_path = os.path.join(
-                        self.output_dir,
-                        f"{os.path.splitext(os.path.basename(self.pdf_path))[0]}_page_{actual_page_number}.png"
-                    )
-                    image.save(output_path, 'PNG')
-                    saved_files.append(output_path)
-                
-                # Update progress
-                progress = int((i + 1) / total_pages * 100)
-                self.progress_updated.emit(progress)
-            
-            self.finished.emit(saved_files)
+            requested = sorted(set(self.pages))
+            self.total_pages = len(requested)
+            self.served_pages = 0
+
+            # Output path of every page actually written, by page number
+            saved_files = {}
+
+            # Serve pages already in the render cache without rendering them
+            to_render = requested
+            if self.cache:
+                pdf_hash = self.cache.file_hash(self.pdf_path)
+                to_render = []
+                for page in requested:
+                    if self.cache.fetch(self.cache_entry(pdf_hash, page), self.output_path(page)):
+                        saved_files[page] = self.output_path(page)
+                        self.served_pages += 1
+                    else:
+                        to_render.append(page)
+                if self.served_pages:
+                    self.emit_progress(0)
+
+            if self.extract_images and to_render:
+                for page in single_image_pages(self.pdf_path, to_render, self.poppler_path):
+                    output_path = extract_page_image(self.pdf_path, page, self.output_dir,
+                                                     self.poppler_path)
+                    if output_path:
+                        self.extracted[page] = output_path
+                        self.served_pages += 1
+                        self.emit_progress(0)
+                to_render = [page for page in to_render if page not in self.extracted]
+                saved_files.update(self.extracted)
+
+            # Pages past the end of the document are not rendered and so
+            # missing from the result
+            written = {}
+            if to_render:
+                if self.parallel:
+                    written = self.run_parallel(to_render)
+                else:
+                    written = self.run_serial(to_render)
+            saved_files.update(written)
+
+            if self.cache:
+                for page, path in written.items():
+                    self.cache.store(self.cache_entry(pdf_hash, page), path)
+                self.cache.evict()
+
+            self.finished.emit([saved_files[page] for page in requested if page in saved_files])
         except Exception as e:
             self.error_occurred.emit(str(e))
 
 
+# Upper bound for one decoded strip in tiled resize mode
+STRIP_BUDGET = 64 * 1024 * 1024
+
+
+def open_image(image_path, allow_large=False):
+    """Open an image, optionally skipping Pillow's decompression bomb check"""
+    if not allow_large:
+        return Image.open(image_path)
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        return Image.open(image_path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+
+def can_decode_in_strips(img):
+    # Strip decoding needs the file split into several independently
+    # decodable tiles (e.g. striped or tiled TIFF, not handed to libtiff)
+    # stored in display orientation
+    return (len(img.tile) > 1 and not getattr(img, "use_load_libtiff", False)
+            and getattr(img, "_tile_size", img.size) == img.size)
+
+
+def decode_tile_band(image_path, tiles, top, bottom):
+    """Decode only the given tiles, covering source rows top..bottom"""
+    band = open_image(image_path, allow_large=True)
+    band._size = (band.size[0], bottom - top)
+    if hasattr(band, "_tile_size"):
+        band._tile_size = band._size
+    shifted = []
+    for tile in tiles:
+        extents = (tile[1][0], tile[1][1] - top, tile[1][2], tile[1][3] - top)
+        if hasattr(tile, "_replace"):  # Pillow 11+ uses named tuples
+            shifted.append(tile._replace(extents=extents))
+        else:
+            shifted.append((tile[0], extents) + tuple(tile[2:]))
+    band.tile = shifted
+    band.load()
+    return band
+
+
+def reduce_in_strips(image_path, img, target_size):
+    """Box-reduce a large image strip by strip to about twice target_size"""
+    width, height = img.size
+    factor = max(1, min(width // target_size[0], height // target_size[1]) // 2)
+    work_mode = img.mode if img.mode in ("L", "LA", "RGB", "RGBA", "CMYK", "I", "F") else "RGBA"
+    band_rows = max(factor, STRIP_BUDGET // (width * len(img.getbands())))
+
+    # Group tiles into horizontal bands of roughly band_rows source rows
+    bands = []
+    for tile in sorted(img.tile, key=lambda t: (t[1][1], t[1][0])):
+        top, bottom = tile[1][1], tile[1][3]
+        # Tiles in a row already part of the band always join it
+        if bands and (top < bands[-1][1] or bands[-1][1] - bands[-1][0] < band_rows):
+            bands[-1][1] = max(bands[-1][1], bottom)
+            bands[-1][2].append(tile)
+        else:
+            bands.append([top, bottom, [tile]])
+
+    reduced = Image.new(work_mode, (-(-width // factor), -(-height // factor)))
+    out_y = 0
+    carry = None
+    for top, bottom, tiles in bands:
+        band = decode_tile_band(image_path, tiles, top, bottom)
+        if band.mode != work_mode:
+            band = band.convert(work_mode)
+        if carry:
+            merged = Image.new(work_mode, (width, carry.height + band.height))
+            merged.paste(carry, (0, 0))
+            merged.paste(band, (0, carry.height))
+            band = merged
+
+        # Rows that do not fill a whole reduce block wait for the next band
+        usable = band.height if bottom >= height else band.height - band.height % factor
+        carry = band.crop((0, usable, width, band.height)) if usable < band.height else None
+        if usable:
+            part = band.crop((0, 0, width, usable)).reduce(factor)
+            reduced.paste(part, (0, out_y))
+            out_y += part.height
+    return reduced
+
+
+def prepare_source(img, image_path, target_size, quality="exact", tiled_threshold=None):
+    """Decode img for resizing to target_size, with bounded memory for large images"""
+    pixels = img.size[0] * img.size[1]
+    large = bool(tiled_threshold) and pixels > tiled_threshold
+
+    if img.format == "JPEG" and (quality == "fast" or large):
+        # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 in the DCT domain
+        img.draft(img.mode, target_size)
+        return img
+    if large and can_decode_in_strips(img):
+        return reduce_in_strips(image_path, img, target_size)
+
+    # Anything else is decoded in full, so keep Pillow's bomb protection
+    limit = Image.MAX_IMAGE_PIXELS
+    if limit and pixels > 2 * limit:
+        raise Image.DecompressionBombError(
+            f"Image size ({pixels} pixels) exceeds limit and cannot be decoded in strips")
+    return img
+
+
+def output_format_for(img, image_format=None):
+    """Resolve the output format; None keeps the source format where supported"""
+    if image_format:
+        return image_format
+    return img.format if img.format in IMAGE_FORMATS else "PNG"
+
+
+def output_extension(image_path, img, image_format):
+    # Keep the source extension (.jpeg, .tiff, ...) when the format is unchanged
+    extension = os.path.splitext(image_path)[1]
+    if image_format == img.format and extension:
+        return extension
+    return IMAGE_FORMATS[image_format]
+
+
+# Modes each output format can write; anything else is converted first
+SAVE_MODES = {
+    "PNG": ("1", "L", "LA", "P", "RGB", "RGBA", "I", "I;16"),
+    "JPEG": ("L", "RGB", "CMYK"),
+    "WEBP": ("RGB", "RGBA"),
+    "TIFF": ("1", "L", "LA", "P", "RGB", "RGBA", "CMYK", "YCbCr", "I", "I;16", "F"),
+}
+
+
+def writable_image(img, image_format):
+    """Convert img to a mode image_format can write, keeping alpha where possible"""
+    modes = SAVE_MODES[image_format]
+    if img.mode in modes:
+        return img
+    has_alpha = "A" in img.mode or "transparency" in img.info
+    return img.convert("RGBA" if has_alpha and "RGBA" in modes else "RGB")
+
+
+def orientation_swaps_sides(img):
+    """Whether the EXIF orientation displays img rotated by 90 degrees"""
+    return img.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+
+
+def save_resized(img, output_path, image_format="PNG", profile="balanced",
+                 encoder_options=None, keep_metadata=True, source_info=None):
+    options = encoder_options or ENCODER_PROFILES[profile]
+    image_options = dict(options.get(image_format, {}))
+    source_info = source_info or {}
+
+    if keep_metadata:
+        for key in ("exif", "icc_profile"):
+            if source_info.get(key):
+                image_options[key] = source_info[key]
+    else:
+        # Bake the EXIF orientation into the pixels before dropping it
+        img = ImageOps.exif_transpose(img)
+        image_options["icc_profile"] = None
+        image_options["exif"] = b""
+        img.info.pop("exif", None)
+        img.info.pop("icc_profile", None)
+
+    img = writable_image(img, image_format)
+    img.save(output_path, image_format, **image_options)
+
+
+def resize_image(image_path, output_dir, width, height, image_format=None, profile="balanced",
+                 percent=None, quality="exact", tiled_threshold=None,
+                 encoder_options=None, keep_metadata=True):
+    """Resize one image and save it; safe to run in a pool process"""
+    # Open the image; only the header is read at this point
+    img = open_image(image_path, allow_large=bool(tiled_threshold))
+    source_info = dict(img.info)
+    image_format = output_format_for(img, image_format)
+    extension = output_extension(image_path, img, image_format)
+
+    # Sizes are requested for the image as it is displayed. The stored
+    # pixels are resized and then either keep the orientation tag or are
+    # transposed on save, so work out the stored size here
+    swapped = orientation_swaps_sides(img)
+    source_size = img.size[::-1] if swapped else img.size
+
+    # Percentage mode: dimensions come from the image header read above
+    if percent:
+        width = int(source_size[0] * percent / 100)
+        height = int(source_size[1] * percent / 100)
+
+    # Calculate new dimensions
+    if width == 0 and height > 0:
+        # Calculate width based on height to maintain aspect ratio
+        w_percent = (height / float(source_size[1]))
+        new_width = int((float(source_size[0]) * float(w_percent)))
+        new_size = (new_width, height)
+    elif height == 0 and width > 0:
+        # Calculate height based on width to maintain aspect ratio
+        h_percent = (width / float(source_size[0]))
+        new_height = int((float(source_size[1]) * float(h_percent)))
+        new_size = (width, new_height)
+    elif width > 0 and height > 0:
+        # Use both dimensions
+        new_size = (width, height)
+    else:
+        raise ValueError("At least one dimension (width or height) must be greater than 0")
+    if swapped:
+        new_size = new_size[::-1]
+
+    # Resize the image
+    img = prepare_source(img, image_path, new_size, quality, tiled_threshold)
+    if quality == "fast":
+        # reduce() by an integer factor and finish with a LANCZOS pass
+        img = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    else:
+        img = img.resize(new_size, Image.Resampling.LANCZOS)
+
+    # Save the resized image
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    output_path = os.path.join(output_dir, f"{base_name}_resized{extension}")
+    save_resized(img, output_path, image_format, profile, encoder_options,
+                 keep_metadata, source_info)
+    return output_path
+
+
+def resize_image_set(image_path, output_dir, widths, image_format=None, profile="balanced",
+                     quality="exact", tiled_threshold=None, encoder_options=None,
+                     keep_metadata=True):
+    """Decode an image once and write one output per width, named <name>_w<width>"""
+    img = open_image(image_path, allow_large=bool(tiled_threshold))
+    source_info = dict(img.info)
+    image_format = output_format_for(img, image_format)
+    extension = output_extension(image_path, img, image_format)
+    # Widths are for the image as displayed; see resize_image
+    swapped = orientation_swaps_sides(img)
+    original_width, original_height = img.size[::-1] if swapped else img.size
+    widths = sorted(set(widths), reverse=True)
+
+    def stored_size(width):
+        size = (width, max(1, int(original_height * width / original_width)))
+        return size[::-1] if swapped else size
+
+    img = prepare_source(img, image_path, stored_size(widths[0]), quality, tiled_threshold)
+
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    output_paths = []
+    # Cascade from largest to smallest, each size resampled from the previous one
+    for width in widths:
+        new_size = stored_size(width)
+        if quality == "fast":
+            img = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        else:
+            img = img.resize(new_size, Image.Resampling.LANCZOS)
+
+        output_path = os.path.join(output_dir, f"{base_name}_w{width}{extension}")
+        save_resized(img, output_path, image_format, profile, encoder_options,
+                     keep_metadata, source_info)
+        output_paths.append(output_path)
+    return output_paths
+
+
 class ImageResizerWorker(QThread):
     progress_updated = pyqtSignal(int, str)  # (progress, filename)
     finished = pyqtSignal(str)  # output_path
     error_occurred = pyqtSignal(str, str)  # (error_msg, filename)
 
-    def __init__(self, image_path, output_dir, width, height):
+    def __init__(self, image_path, output_dir, width, height, **resize_options):
+        """resize_options are passed on to resize_image (image_format, quality, ...)"""
         super().__init__()
         self.image_path = image_path
         self.output_dir = output_dir
         self.width = width
         self.height = height
+        self.resize_options = resize_options
 
     def run(self):
         try:
-            # Open the image
-            img = Image.open(self.image_path)
-            
-            # Calculate new dimensions
-            if self.width == 0 and self.height > 0:
-                # Calculate width based on height to maintain aspect ratio
-                w_percent = (self.height / float(img.size[1]))
-                new_width = int((float(img.size[0]) * float(w_percent)))
-                new_size = (new_width, self.height)
-            elif self.height == 0 and self.width > 0:
-                # Calculate height based on width to maintain aspect ratio
-                h_percent = (self.width / float(img.size[0]))
-                new_height = int((float(img.size[1]) * float(h_percent)))
-                new_size = (self.width, new_height)
-            elif self.width > 0 and self.height > 0:
-                # Use both dimensions
-                new_size = (self.width, self.height)
-            else:
-                raise ValueError("At least one dimension (width or height) must be greater than 0")
-            
-            # Resize the image
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
-            
-            # Save the resized image
-            base_name = os.path.splitext(os.path.basename(self.image_path))[0]
-            output_path = os.path.join(self.output_dir, f"{base_name}_resized.png")
-            img.save(output_path, 'PNG', quality=95)
-            
+            output_path = resize_image(self.image_path, self.output_dir, self.width,
+                                       self.height, **self.resize_options)
             self.progress_updated.emit(100, self.image_path)
             self.finished.emit(output_path)
         except Exception as e:
             self.error_occurred.emit(str(e), self.image_path)
 
+
+class ImageResizerPool(QThread):
+    progress_updated = pyqtSignal(int, str)  # (overall progress, filename)
+    file_finished = pyqtSignal(str)  # output_path
+    finished = pyqtSignal(list)  # output paths
+    error_occurred = pyqtSignal(str, str)  # (error_msg, filename)
+
+    def __init__(self, jobs, output_dir, max_workers=None, percent=None, size_set=None,
+                 **resize_options):
+        """jobs is a list of (image_path, width, height) tuples; with percent
+        or size_set (a list of widths) set, width and height are ignored.
+        resize_options (image_format, quality, tiled_threshold, ...) are
+        passed on to resize_image/resize_image_set"""
+        super().__init__()
+        self.jobs = jobs
+        self.output_dir = output_dir
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.percent = percent
+        self.size_set = size_set
+        self.resize_options = resize_options
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        output_paths = []
+        total = len(self.jobs)
+        done = 0
+        pending = iter(self.jobs)
+        in_flight = {}
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers,
+                                     mp_context=POOL_CONTEXT) as pool:
+                def submit_next():
+                    job = next(pending, None)
+                    if job:
+                        image_path, width, height = job
+                        if self.size_set:
+                            future = pool.submit(resize_image_set, image_path, self.output_dir,
+                                                 self.size_set, **self.resize_options)
+                        else:
+                            future = pool.submit(resize_image, image_path, self.output_dir,
+                                                 width, height, percent=self.percent,
+                                                 **self.resize_options)
+                        in_flight[future] = image_path
+
+                # Back-pressure: only a couple of jobs per process are queued at
+                # any time instead of submitting the whole list up front
+                for _ in range(self.max_workers * 2):
+                    submit_next()
+
+                while in_flight:
+                    completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        image_path = in_flight.pop(future)
+                        try:
+                            result = future.result()
+                            # Size sets produce several files per source image
+                            for output_path in (result if self.size_set else [result]):
+                                output_paths.append(output_path)
+                                self.file_finished.emit(output_path)
+                        except Exception as e:
+                            self.error_occurred.emit(str(e), image_path)
+
+                        done += 1
+                        self.progress_updated.emit(int(done / total * 100), image_path)
+                        if not self.cancelled:
+                            submit_next()
+        except Exception as e:
+            # Pool-level failure such as a crashed worker process
+            self.error_occurred.emit(str(e), "")
+
+        self.finished.emit(output_paths)
+
+
+def index_pdf(pdf_path):
+    """Page count, page sizes, encryption state and hash of a PDF; runs in a pool process"""
+    stat = os.stat(pdf_path)
+    info = {
+        "path": pdf_path,
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "pages": 0,
+        "page_sizes": [],
+        "encrypted": False,
+        "sha256": None,
+        "error": None,
+    }
+    try:
+        info["sha256"] = RenderCache.file_hash(pdf_path)
+        reader = PdfReader(pdf_path)
+        info["encrypted"] = reader.is_encrypted
+        # Files with an empty user password can still be merged
+        if reader.is_encrypted and not reader.decrypt(""):
+            info["error"] = "Password protected"
+            return info
+        info["pages"] = len(reader.pages)
+        info["page_sizes"] = [(round(float(page.mediabox.width)), round(float(page.mediabox.height)))
+                              for page in reader.pages]
+    except Exception as e:
+        info["error"] = str(e)
+    return info
+
+
+class PdfIndexWorker(QThread):
+    file_indexed = pyqtSignal(dict)  # index_pdf() result
+    finished = pyqtSignal()
+
+    def __init__(self, pdf_files, max_workers=None):
+        super().__init__()
+        self.pdf_files = pdf_files
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def run(self):
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(self.pdf_files)),
+                                     mp_context=POOL_CONTEXT) as pool:
+                futures = [pool.submit(index_pdf, path) for path in self.pdf_files]
+                for future in as_completed(futures):
+                    self.file_indexed.emit(future.result())
+        except Exception as e:
+            # Indexing is best effort; the merge reports real failures
+            for path in self.pdf_files:
+                self.file_indexed.emit({"path": path, "mtime": None, "error": str(e)})
+        self.finished.emit()
+
+
+def page_selection_runs(text, page_count):
+    """Turn "1-3,5,8-,last" into 1-based (first, last) runs; empty means all pages"""
+    text = text.strip()
+    if not text:
+        return [(1, page_count)]
+
+    def page_number(token):
+        token = token.strip().lower()
+        number = page_count if token == "last" else int(token)
+        if not 1 <= number <= page_count:
+            raise ValueError(f"Page {number} is out of range (1-{page_count})")
+        return number
+
+    runs = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            first = page_number(start) if start.strip() else 1
+            last = page_number(end) if end.strip() else page_count
+            if first > last:
+                raise ValueError(f"Invalid page range: {part.strip()}")
+            runs.append((first, last))
+        else:
+            number = page_number(part)
+            runs.append((number, number))
+    return runs
+
+
+def parse_page_selection(text, page_count):
+    """0-based page indices for a page selection such as 1-3,last"""
+    return [index for first, last in page_selection_runs(text, page_count)
+            for index in range(first - 1, last)]
+
+
+def linearize_pdf(pdf_path):
+    """Rewrite pdf_path in place as a linearized ("fast web view") PDF"""
+    temp_path = pdf_path + ".linearized"
+    try:
+        import pikepdf
+    except ImportError:
+        pikepdf = None
+
+    if pikepdf:
+        with pikepdf.open(pdf_path) as pdf:
+            pdf.save(temp_path, linearize=True)
+    else:
+        qpdf = shutil.which("qpdf")
+        if not qpdf:
+            raise RuntimeError("Linearized output requires pikepdf (pip install pikepdf) "
+                               "or the qpdf command line tool")
+        result = subprocess.run([qpdf, "--linearize", pdf_path, temp_path],
+                                capture_output=True, text=True)
+        # Exit code 3 means the file was written with warnings
+        if result.returncode not in (0, 3):
+            raise RuntimeError(f"qpdf failed: {result.stderr.strip()}")
+    os.replace(temp_path, pdf_path)
+
+
+class PdfMergeWorker(QThread):
+    progress_updated = pyqtSignal(int, str)  # (progress, status text)
+    finished = pyqtSignal(str)  # output_path
+    error_occurred = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, pdf_files, output_path, streaming=False, dedupe=False, linearize=False,
+                 page_selections=None, page_counts=None):
+        super().__init__()
+        self.pdf_files = pdf_files
+        self.output_path = output_path
+        # Optional page selection text per file path, e.g. "1-3,last"
+        self.page_selections = page_selections or {}
+        # Page counts from the tab's index weight progress by pages instead of bytes
+        self.page_counts = page_counts or {}
+        self.linearize = linearize
+        # Streaming copies pages straight to disk and keeps one input open at a
+        # time; deduplication is done by the streaming writer as well
+        self.streaming = streaming or dedupe
+        self.dedupe = dedupe
+        self.duplicates = 0
+        self.bytes_saved = 0
+        self.is_cancelled = False
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def open_reader(self, source):
+        """Open a PdfReader from a path or a binary file object; PyPDF2 reads
+        a path into memory in full, a file object is read on demand"""
+        reader = PdfReader(source)
+        if reader.is_encrypted:
+            reader.decrypt("")
+        return reader
+
+    def work_sizes(self):
+        if all(path in self.page_counts for path in self.pdf_files):
+            return [max(self.page_counts[path], 1) for path in self.pdf_files]
+        return [os.path.getsize(path) for path in self.pdf_files]
+
+    def selected_pages(self, file_path, reader):
+        selection = self.page_selections.get(file_path, "")
+        if not selection.strip():
+            return None
+        return parse_page_selection(selection, len(reader.pages))
+
+    def throughput(self, pages, total_bytes):
+        elapsed = max(time.perf_counter() - self.start_time, 1e-6)
+        return f"{pages / elapsed:.1f} pages/s, {total_bytes / elapsed / 1048576:.1f} MB/s"
+
+    def run_streaming(self, sizes):
+        total_size = max(sum(sizes), 1)
+        done_size = 0
+        done_bytes = 0
+        pages = 0
+
+        # The output may be one of the inputs, so it is only replaced once
+        # everything has been copied
+        part_path = self.output_path + ".part"
+        writer = StreamingPdfWriter(part_path, dedupe=self.dedupe)
+        try:
+            for index, (file_path, size) in enumerate(zip(self.pdf_files, sizes)):
+                def page_done(page, page_count):
+                    if self.is_cancelled:
+                        raise InterruptedError
+                    progress = int((done_size + size * page / page_count) / total_size * 100)
+                    self.progress_updated.emit(
+                        progress,
+                        f"File {index + 1}/{len(self.pdf_files)}: {os.path.basename(file_path)} "
+                        f"page {page}/{page_count} ({self.throughput(pages + page, done_bytes)})"
+                    )
+
+                # Only the selected pages and the objects they use are read,
+                # straight from the file rather than from an in-memory copy
+                with open(file_path, "rb") as stream:
+                    reader = self.open_reader(stream)
+                    selected = self.selected_pages(file_path, reader)
+                    writer.add_reader(reader, page_done, selected)
+                    pages += len(selected) if selected is not None else len(reader.pages)
+                done_size += size
+                done_bytes += os.path.getsize(file_path)
+                # Release the input before opening the next one
+                del reader
+            writer.close()
+            os.replace(part_path, self.output_path)
+        except BaseException as e:
+            if not writer.stream.closed:
+                writer.abort()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            if isinstance(e, InterruptedError):
+                self.cancelled.emit()
+                return
+            raise
+
+        self.duplicates = writer.duplicates
+        self.bytes_saved = writer.bytes_saved
+        status = f"Done: {pages} pages ({self.throughput(pages, done_bytes)})"
+        if self.dedupe:
+            status += (f", {self.duplicates} duplicate streams shared, "
+                       f"{self.bytes_saved / 1048576:.1f} MB saved")
+        if self.linearize:
+            self.progress_updated.emit(95, "Linearizing...")
+            linearize_pdf(self.output_path)
+        self.progress_updated.emit(100, status)
+        self.finished.emit(self.output_path)
+
+    def run(self):
+        try:
+            self.start_time = time.perf_counter()
+            if self.streaming:
+                self.run_streaming(self.work_sizes())
+                return
+
+            # Progress is weighted by page count when the index knows it,
+            # otherwise by input size
+            sizes = self.work_sizes()
+            total_size = max(sum(sizes), 1)
+            done_size = 0
+            done_bytes = 0
+            pages = 0
+
+            writer = PdfWriter()
+            for index, (file_path, size) in enumerate(zip(self.pdf_files, sizes)):
+                if self.is_cancelled:
+                    writer.close()
+                    self.cancelled.emit()
+                    return
+
+                reader = self.open_reader(file_path)
+                selected = self.selected_pages(file_path, reader)
+                # One append per input, so resources shared by the selected
+                # pages (fonts, logos) are copied once
+                writer.append(reader, pages=selected)
+                pages += len(selected) if selected is not None else len(reader.pages)
+                done_size += size
+                done_bytes += os.path.getsize(file_path)
+
+                # Appending is the first half of the work, writing the second
+                progress = int(done_size / total_size * 50)
+                self.progress_updated.emit(
+                    progress,
+                    f"File {index + 1}/{len(self.pdf_files)}: {os.path.basename(file_path)} "
+                    f"({pages} pages, {self.throughput(pages, done_bytes)})"
+                )
+
+            if self.is_cancelled:
+                writer.close()
+                self.cancelled.emit()
+                return
+
+            self.progress_updated.emit(50, f"Writing {pages} pages...")
+            writer.write(self.output_path)
+            writer.close()
+
+            if self.linearize:
+                self.progress_updated.emit(90, "Linearizing...")
+                linearize_pdf(self.output_path)
+
+            self.progress_updated.emit(100, f"Done: {pages} pages ({self.throughput(pages, done_bytes)})")
+            self.finished.emit(self.output_path)
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+
+
+def image_page_size(img_width, img_height, min_width=300, max_width=584):
+    """PDF page size in points for an image, keeping its aspect ratio while
+    clamping the width between min_width and max_width"""
+    # Images are placed at 72dpi, so one pixel is one point before scaling
+    width, height = float(img_width), float(img_height)
+    if width < min_width:
+        height *= min_width / width
+        width = min_width
+    elif width > max_width:
+        height *= max_width / width
+        width = max_width
+    return width, height
+
+
+def jpeg_passthrough(img):
+    """Whether fpdf can embed the image's JPEG data without re-encoding it"""
+    return img.format == "JPEG" and img.mode in ("RGB", "L", "CMYK")
+
+
+def prepare_pdf_image(img_path, min_width=300, max_width=584, target_dpi=None, jpeg_quality=85):
+    """Read an image for embedding, returns (data, page width, page height,
+    passthrough, source bytes). With target_dpi the image is downsampled to
+    that resolution on its page; JPEGs are recompressed as JPEG and
+    lossless sources stay lossless"""
+    with open(img_path, "rb") as f:
+        data = f.read()
+
+    # PIL only parses the header here; the pixels are decoded once, either
+    # below or by fpdf when embedding
+    with Image.open(io.BytesIO(data)) as img:
+        page_width, page_height = image_page_size(img.width, img.height, min_width, max_width)
+        passthrough = jpeg_passthrough(img)
+        source_format = img.format
+        target_width = round(page_width / 72 * target_dpi) if target_dpi else img.width
+        downsample = bool(target_dpi) and img.width > target_width
+        # Small enough already: JPEGs are passed through and lossless sources
+        # are compressed losslessly by fpdf
+        if not downsample and (passthrough or source_format != "JPEG"):
+            return data, page_width, page_height, passthrough, len(data)
+
+        if downsample:
+            target_size = (max(target_width, 1),
+                           max(round(img.height * target_width / img.width), 1))
+            if source_format == "JPEG":
+                img.draft(img.mode, target_size)
+            img = img.resize(target_size, Image.LANCZOS, reducing_gap=2.0)
+
+        output = io.BytesIO()
+        if source_format == "JPEG":
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.save(output, "JPEG", quality=jpeg_quality, optimize=True)
+        else:
+            # Scans, screenshots, line art and alpha stay lossless
+            writable_image(img, "PNG").save(output, "PNG", **ENCODER_PROFILES["balanced"]["PNG"])
+        return output.getvalue(), page_width, page_height, False, len(data)
+
+
+def embedded_size(info):
+    """Bytes an image parsed by fpdf takes up in the PDF"""
+    return len(info["data"]) + len(info.get("smask") or b"") + len(info.get("pal") or b"")
+
+
+class ImageToPdfWorker(QThread):
+    progress_updated = pyqtSignal(int, str)  # (progress, status text)
+    finished = pyqtSignal(str)  # output_path
+    error_occurred = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, image_paths, output_path, linearize=False, min_width=300, max_width=584,
+                 preprocess=False, target_dpi=150, jpeg_quality=85, processes=None,
+                 streaming=False):
+        super().__init__()
+        self.image_paths = image_paths
+        self.output_path = output_path
+        self.linearize = linearize
+        self.min_width = min_width
+        self.max_width = max_width
+        # Preprocessing downsamples and recompresses images on a process pool
+        # before they reach the (single threaded) PDF writer
+        self.preprocess = preprocess
+        self.target_dpi = target_dpi
+        self.jpeg_quality = jpeg_quality
+        self.processes = processes or os.cpu_count() or 1
+        # Streaming writes every image to disk as its page is added instead of
+        # holding all of them in the FPDF document until the end
+        self.streaming = streaming
+        # Input bytes embedded as-is (JPEG DCT streams) versus decoded and
+        # compressed again
+        self.passthrough_bytes = 0
+        self.reencoded_bytes = 0
+        self.reencoded_images = 0
+        # Identical images are embedded once and shared between their pages;
+        # keyed by a hash of the data handed to the writer
+        self.shared_images = {}
+        self.duplicates = 0
+        self.bytes_saved = 0
+        self.is_cancelled = False
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def prepared_images(self, pool=None):
+        """Yield (path, prepare_pdf_image result) in list order"""
+        if pool is None:
+            for img_path in self.image_paths:
+                yield img_path, prepare_pdf_image(img_path, self.min_width, self.max_width)
+            return
+
+        pending = iter(self.image_paths)
+        queue = deque()
+
+        def submit_next():
+            img_path = next(pending, None)
+            if img_path:
+                queue.append((img_path, pool.submit(
+                    prepare_pdf_image, img_path, self.min_width, self.max_width,
+                    self.target_dpi, self.jpeg_quality)))
+
+        # Back-pressure: results are consumed in order, so only a couple of
+        # images per process are prepared ahead of the writer
+        for _ in range(self.processes * 2):
+            submit_next()
+
+        while queue:
+            img_path, future = queue.popleft()
+            result = future.result()
+            submit_next()
+            yield img_path, result
+
+    def run(self):
+        pool = None
+        writer = None
+        try:
+            start_time = time.perf_counter()
+            if self.streaming:
+                writer = StreamingPdfWriter(self.output_path)
+            else:
+                pdf = FPDF(unit="pt")
+                pdf.set_auto_page_break(False)
+            if self.preprocess:
+                pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=POOL_CONTEXT)
+
+            total = len(self.image_paths)
+            for index, (img_path, result) in enumerate(self.prepared_images(pool)):
+                if self.is_cancelled:
+                    if writer:
+                        writer.abort()
+                        os.remove(self.output_path)
+                    self.cancelled.emit()
+                    return
+
+                data, page_width, page_height, passthrough, source_bytes = result
+                if passthrough:
+                    self.passthrough_bytes += source_bytes
+                else:
+                    self.reencoded_bytes += source_bytes
+                    self.reencoded_images += 1
+
+                digest = hashlib.sha256(data).digest()
+                if digest in self.shared_images:
+                    self.duplicates += 1
+                    self.bytes_saved += self.shared_images[digest][1]
+
+                if writer:
+                    if digest not in self.shared_images:
+                        # Same image encoding as fpdf, but written out right away
+                        info = get_img_info(img_path, data)
+                        self.shared_images[digest] = (writer.write_image(info), embedded_size(info))
+                    writer.add_image_page(self.shared_images[digest][0], page_width, page_height)
+                else:
+                    # fpdf keys its image cache by content too, so a repeated
+                    # image is neither decoded nor embedded again
+                    pdf.add_page(format=(page_width, page_height))
+                    info = pdf.image(io.BytesIO(data), 0, 0, page_width, page_height)
+                    self.shared_images.setdefault(digest, (None, embedded_size(info)))
+
+                # Writing the file is the last part of the work
+                self.progress_updated.emit(
+                    int((index + 1) / total * 90),
+                    f"Image {index + 1}/{total}: {os.path.basename(img_path)}"
+                )
+
+            if self.is_cancelled:
+                if writer:
+                    writer.abort()
+                    os.remove(self.output_path)
+                self.cancelled.emit()
+                return
+
+            self.progress_updated.emit(90, f"Writing {total} pages...")
+            if writer:
+                writer.close()
+            else:
+                pdf.output(self.output_path)
+            if self.linearize:
+                self.progress_updated.emit(95, "Linearizing...")
+                linearize_pdf(self.output_path)
+
+            elapsed = time.perf_counter() - start_time
+            self.progress_updated.emit(
+                100,
+                f"Done: {total} pages in {elapsed:.1f}s, "
+                f"{self.passthrough_bytes / 1048576:.1f} MB passed through, "
+                f"{self.reencoded_bytes / 1048576:.1f} MB re-encoded, "
+                f"{self.duplicates} duplicates shared ({self.bytes_saved / 1048576:.1f} MB saved)"
+            )
+            self.finished.emit(self.output_path)
+        except Exception as e:
+            if writer and not writer.stream.closed:
+                writer.abort()
+                os.remove(self.output_path)
+            self.error_occurred.emit(str(e))
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)